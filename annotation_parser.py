@@ -0,0 +1,114 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 标注行解析 "url [[x1,y1,x2,y2],...] [cls,...]",正则校验格式后用numpy一次解析全部坐标,格式不规整时退回ast.literal_eval
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import re, ast, time
+import numpy as np
+
+_NUM = r"-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?"
+_BOX = r"\[{0},{0},{0},{0}\]".format(_NUM)
+BBOX_PATTERN = re.compile(r"\[(?:{0}(?:,{0})*)?\]".format(_BOX))
+# 与str(ast.literal_eval(token))结果相同的类别写法: 不带前导0且不为-0的整数、不含转义的引号字符串
+CLS_PATTERN = re.compile(r"(0|-?[1-9]\d*)|'([^'\\]*)'|\"([^\"\\]*)\"")
+
+
+def _parse_bbox(text):
+    if BBOX_PATTERN.fullmatch(text):
+        if text == "[]":
+            return np.empty((0, 4), dtype=np.int64)
+        values = np.array(text.replace("[", "").replace("]", "").split(","), dtype=np.float64)
+        return values.astype(np.int64).reshape(-1, 4)
+    bbox = ast.literal_eval(text)
+    for b in bbox:
+        if len(b) != 4:
+            raise ValueError("ERROR: bbox must be [x1, y1, x2, y2], got " + str(b))
+    return np.array([[int(x) for x in b] for b in bbox], dtype=np.int64).reshape(-1, 4)
+
+
+def _parse_cls(text):
+    if len(text) >= 2 and text[0] == "[" and text[-1] == "]":
+        body = text[1:-1]
+        if not body:
+            return []
+        cls = []
+        for token in body.split(","):
+            m = CLS_PATTERN.fullmatch(token)
+            if m is None:
+                break
+            cls.append(next(g for g in m.groups() if g is not None))
+        else:
+            return cls
+    return [str(c) for c in ast.literal_eval(text)]
+
+
+def parse_annotation(line):
+    """
+    @description  : 解析一行标注
+    ---------
+    @line         : "url [[x1,y1,x2,y2],...] [cls,...]"
+    -------
+    @Returns      :
+            image_url : 图片地址
+                boxes : (N, 4) int64坐标数组，与int(x)相同，向0取整
+                  cls : N个类别名字符串，与str(c)相同
+    -------
+    """
+    line_list = line.strip().split(" ")
+    if len(line_list) < 3:
+        raise ValueError("ERROR: annotation line must be 'url bbox cls', got " + line.strip())
+    boxes = _parse_bbox(line_list[1])
+    cls = _parse_cls(line_list[2])
+    if len(boxes) != len(cls):
+        raise ValueError("ERROR: bbox.size != cls.size")
+    return line_list[0], boxes, cls
+
+
+def _parse_annotation_ast(line):
+    # 原实现，仅用于对比
+    line_list = line.strip().split(" ")
+    bbox = ast.literal_eval(line_list[1])
+    cls = ast.literal_eval(line_list[2])
+    assert len(bbox) == len(cls), "ERROR: bbox.size != cls.size"
+    return line_list[0], [[int(x) for x in b] for b in bbox], [str(c) for c in cls]
+
+
+def benchmark(num_lines=20000, num_boxes=8, seed=0):
+    """
+    @description  : 与ast.literal_eval逐行解析对比速度，并核对结果一致
+    ---------
+    @params       :
+            num_lines : 标注行数
+            num_boxes : 每行目标数
+    -------
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(num_lines):
+        boxes = rng.integers(0, 2048, (num_boxes, 4))
+        bbox = "[" + ",".join("[{},{},{},{}]".format(*b) for b in boxes) + "]"
+        cls = "[" + ",".join(str(c) for c in rng.integers(0, 20, num_boxes)) + "]"
+        if i % 2:
+            cls = "[" + ",".join("'class_{}'".format(c) for c in rng.integers(0, 20, num_boxes)) + "]"
+        lines.append("http://host/images/{}.jpg {} {}\n".format(i, bbox, cls))
+
+    start = time.perf_counter()
+    expected = [_parse_annotation_ast(line) for line in lines]
+    ast_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = [parse_annotation(line) for line in lines]
+    fast_time = time.perf_counter() - start
+
+    for (url, bbox, cls), (url_, boxes, cls_) in zip(expected, parsed):
+        assert url == url_ and bbox == boxes.tolist() and cls == cls_
+
+    print("{} lines x {} boxes: ast.literal_eval {:.3f}s, parse_annotation {:.3f}s, speedup {:.1f}x".format(
+        num_lines, num_boxes, ast_time, fast_time, ast_time / fast_time))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -6,14 +6,28 @@
 @Author             :Zhang Rujia
 @version            :2.0
 '''
-import os, base64, json, time, requests, cv2, docker, tarfile, math, random, ast, re
+import os, base64, json, time, requests, cv2, docker, math, random, re, queue, threading, shutil, uuid, tempfile, contextlib, atexit
 import numpy as np
 from src.utils.utils import load_config, create_logger
-from src.utils.utils import noiseSingleimg, ret_result_image, ret_statistic_img, noiseSingleimg_sec
+from src.utils.utils import noiseSingleimg, ret_result_image, ret_statistic_img
 from src.utils.baseScore import RemoteSensingScore
 from operator import itemgetter
 from src.utils.imgNoise import img_noise
-from skimage.metrics import structural_similarity as ssim
+from src.app.noise_engine import NoiseEngine
+from src.app.perturb_cache import PerturbCache
+from src.app.infer_client import DetectClient, DetectError
+from src.app.local_worker import LocalModelWorker, SocketModelWorker
+from src.app.docker_archive import read_member
+from src.app.docker_pool import ContainerPool, PooledContainer
+from src.app.downloader import Downloader, load_manifest, is_done
+from src.app.annotation_parser import parse_annotation
+from src.app.sec_score import score_families, bootstrap_keys
+from src.app.score_cache import ScoreCache
+from src.app.ssim_store import SsimStore
+from src.app.overlay_cache import OverlayCache
+from src.app.overlay_export import render_all
+from src.app.file_index import FileIndex
+from src.app.atomic_io import write_json, write_bytes
 
 class App_fun():
     
@@ -35,6 +49,43 @@ class App_fun():
         self.docker_tar = False
         self.model_name = ""
         # self.algorithmNo = False
+        engine_cfg = self.cfg.get("noise_engine", {})
+        perturb_cache = None
+        if engine_cfg.get("cache", True):
+            # 扰动样本缓存在所有任务间共享
+            perturb_cache = PerturbCache(engine_cfg.get("cache_dir", os.path.join("./", self.cfg["data"]["user_data"], ".perturb_cache")),
+                                         max_bytes=engine_cfg.get("cache_max_gb", 20) * 1024 ** 3,
+                                         logger=self.logger)
+        self.noise_engine = NoiseEngine(executor=engine_cfg.get("executor", "process"),
+                                        workers=engine_cfg.get("workers"),
+                                        chunk_size=engine_cfg.get("chunk_size", 16),
+                                        max_inflight=engine_cfg.get("max_inflight"),
+                                        cache=perturb_cache,
+                                        seed=engine_cfg.get("seed", 0),
+                                        incremental=engine_cfg.get("incremental", True),
+                                        logger=self.logger)
+        self.detect_clients = {} # 检测接口地址 -> DetectClient，复用长连接
+        self.local_worker = None # 本地模型常驻推理进程，每个任务启动一次
+        pool_cfg = self.cfg.get("docker_pool", {})
+        self.docker_pool = ContainerPool(os.path.join("./", self.cfg["data"]["user_data"], ".docker"),
+                                         max_idle=pool_cfg.get("max_idle", 2),
+                                         idle_timeout=pool_cfg.get("idle_timeout", 1800),
+                                         on_close=self._close_pooled_container,
+                                         logger=self.logger)
+        # 定时淘汰超时的空闲容器，服务退出时停止所有容器
+        self.docker_pool.start_reaper(pool_cfg.get("reap_interval", 60))
+        atexit.register(self.docker_pool.close)
+        self.docker_entry = None # 当前任务租用的容器，附带常驻推理进程和结果挂载目录
+        self.docker_container = None
+        # 指标分数缓存，按推理结果和真值的内容哈希存取，不再写入任务的info.json
+        self.score_cache = ScoreCache(self.cfg.get("scoring", {}).get("cache_path", os.path.join("./", self.cfg["data"]["user_data"], ".score_cache.sqlite")))
+        # 推理结果图不再在推理后全部绘制，查看时按需绘制并缓存
+        overlay_cfg = self.cfg.get("overlay", {})
+        self.overlay_cache = OverlayCache(overlay_cfg.get("cache_dir", os.path.join("./", self.cfg["data"]["user_data"], ".overlay_cache")),
+                                          max_bytes=overlay_cfg.get("cache_max_gb", 2) * 1024 ** 3,
+                                          logger=self.logger)
+        self.result_jsons = {} # 推理结果json路径 -> (修改时间, results)
+        self.file_index = None # 当前任务的文件索引，按序号取图片时使用
         
     # 未登录时获取令牌
     def Request_notlog_token (self):
@@ -411,8 +462,19 @@ class App_fun():
     def setTask(self, path_task, taskId):
         try:
             if os.path.exists(path_task):
+                if path_task != self.path_task:
+                    self._close_local_worker()
+                    # 容器放回容器池保温，其他任务使用同一镜像时直接复用
+                    self.docker_pool.release(self.path_task)
+                    self.docker_entry = None
+                    self.docker_container = None
+                    self.result_jsons = {}
+                self.docker_pool.evict_idle()
                 self.path_task = path_task
                 self.taskId = taskId
+                if self.docker_entry is None:
+                    # 切换回之前加载过镜像的任务时，重新租用保温的容器
+                    self._lease_docker_container()
                 self.algorithmNo = None
                 path_json = os.path.join(path_task, 'info.json')
                 # 读取 JSON 文件内容
@@ -720,17 +782,32 @@ class App_fun():
                         "input_data_type": "RGB",
                         "output_data_type": "bounding_box",
                         "results":{}}
+                    # 断点续传: 下载清单中已完成、且上次的gt.json检查点中已有标注的图片直接复用，不再解析
+                    path_manifest = os.path.join(db_dir, ".download.json")
+                    manifest_done = load_manifest(path_manifest)
+                    gt_done = {}
+                    if len(manifest_done) > 0 and os.path.exists(gt_path):
+                        try:
+                            gt_done = self._load_local_json(gt_path)["results"]
+                        except (ValueError, KeyError):
+                            gt_done = {}
+                    
+                    download_cfg = self.cfg.get("download", {})
+                    downloader = Downloader(concurrency=download_cfg.get("concurrency", 8),
+                                            retries=download_cfg.get("retries", 3),
+                                            backoff=download_cfg.get("backoff", 0.5),
+                                            timeout=download_cfg.get("timeout", 60),
+                                            logger=self.logger)
+                    download_tasks = [] # (图片地址, 保存路径)
+                    gt_every = download_cfg.get("gt_checkpoint", 1000) # 每下载完成gt_every张图片保存一次gt.json
                     
                     for i in range(total):
                         
                         downloadURL = items[i]['downloadURL']
                         name = items[i]['name']
                         # 加载图片地址.csv
-                        data_file = requests.get(downloadURL)
                         path_file = os.path.join(db_dir, name)
-
-                        with open(path_file, 'wb') as file:
-                            file.write(data_file.content)
+                        downloader.download(downloadURL, path_file)
                         
                         # 加载图片
                         with open(path_file, 'r') as file:
@@ -739,40 +816,44 @@ class App_fun():
                         count = max(len(str(len(lines))), len(str(k)))
 
                         for line in lines:
-                            line = line.strip()
-                            line_list = line.split(" ")
-                            image_url = line_list[0]
-                            bbox = ast.literal_eval(line_list[1])
-                            cls = ast.literal_eval(line_list[2])
-                            # print("{}, {}, {}".format(image_url, bbox, cls))
+                            image_url = line.strip().split(" ")[0]
+                            type_image = image_url.split(".")[-1]
+                            image_name = "sample_" + str(k).zfill(count) + "." + type_image
+                            image_data_samples = os.path.join(data_samples, image_name)
+                            download_tasks.append((image_url, image_data_samples))
+                            k = k + 1
+
+                            if image_name in gt_done and is_done(manifest_done, image_url, image_data_samples):
+                                gt_json["results"][image_name] = gt_done[image_name]
+                                continue
+                            image_url, boxes, cls = parse_annotation(line)
+                            # print("{}, {}, {}".format(image_url, boxes, cls))
                             
                             img_obj = []
-                            assert len(bbox) == len(cls), "ERROR: bbox.size != cls.size"
-                            for b, c in zip(bbox, cls):
+                            for b, c in zip(boxes.tolist(), cls):
                                 bbox_info = {}
                                 # if str(c) == '0':
                                 #     c = 'b'
                                 # elif str(c) == '2':
                                 #     c = 'd'
-                                bbox_info["class_name"] = str(c)
-                                bbox_info["bbox"] = [int(x) for x in b]
+                                bbox_info["class_name"] = c
+                                bbox_info["bbox"] = b
                                 bbox_info["score"] = 1
                                 img_obj.append(bbox_info)
-                            
-                            type_image = image_url.split(".")[-1]
-                            data_image = requests.get(image_url)
-                            image_name = "sample_" + str(k).zfill(count) + "." + type_image
-                            image_data_samples = os.path.join(data_samples, image_name)
-
-                            k = k + 1
-                            
-                            with open(image_data_samples, 'wb') as file:
-                                file.write(data_image.content)
-                                file.close()
-                                
                             gt_json["results"][image_name] = img_obj
-                            with open(gt_path, "w") as f_result:
-                                f_result.write(json.dumps(gt_json))
+
+                    def save_gt(manifest):
+                        # gt.json只包含已下载完成的图片，中断时与samples目录一致，重新请求时从中续传
+                        write_json(gt_path, dict(gt_json, results={name: obj for name, obj in gt_json["results"].items() if name in manifest}))
+
+                    # 并发下载图片，下载清单记录已完成的图片，中断后重新请求时跳过
+                    try:
+                        downloader.download_all(download_tasks, path_manifest,
+                                                save_every=download_cfg.get("save_every", 100),
+                                                on_checkpoint=save_gt, checkpoint_every=gt_every)
+                    finally:
+                        downloader.close()
+                    self._get_file_index().refresh(data_samples)
 
                     self.logger.info("成功获取数据")
                     print("--OK：成功获取数据")
@@ -930,63 +1011,46 @@ class App_fun():
         data_list = os.listdir(data_path)
         data_list = sorted(data_list)
 
-        # 循环推理
+        # 并发推理
         model = model_name.split(":")[0]
         print(self.cfg['detect_port'][model])
         url = self.cfg['url']['detect_url'] + str(self.cfg['detect_port'][model]) + "/detect/" + model_name
         print(url)
-        for data_image in data_list:
-            # 调用URL接口进行模型推理
-            image_path = os.path.join(data_path, data_image)
-            # print(image_path)
-                
-            image_base64 = self.get_image(image_path)
-                
-            data = {"dataBase64": image_base64}
-            try:
-                headers = {'Content-Type': 'application/json'}
-                response = requests.post(url, headers=headers, data=json.dumps(data))
-                json_data = json.loads(response.text)
-                
-                code = int(json_data["code"])
-                msg = json_data["msg"]
-                data = json_data["data"]
-                self.logger.info(msg)
-                    
-                if code == 0:
-                    # [[61, 45, 200, 211, "class_2", 0.8787]]
-
-                    # 保存到JSON文件
-                    img_obj = []
-                    for tar in data[0]:
-                        bbox_info = {}
-                        bbox_info["class_name"] = str(tar[4])
-                        bbox_info["bbox"] = [int(tar[0]), int(tar[1]), int(tar[2]), int(tar[3])]
-                        bbox_info["score"] = float(tar[5])
-                    
-                        img_obj.append(bbox_info)
-                    # print(img_obj)
-
-                    result_json["results"][data_image] = img_obj
-                else:
-                    return {
-                        "success": False,
-                        "message": msg,
-                        "data": data}
-            except Exception as e:
-                self.logger.error(e)
-                return {
-                    "success": False,
-                    "message": str(e),
-                    "data": {}}
+        try:
+            client = self._detect_client(url, model)
+            result_json["results"] = client.detect_all(data_path, data_list)
+        except DetectError as e:
+            self.logger.info(e.message)
+            return {
+                "success": False,
+                "message": e.message,
+                "data": e.data}
+        except Exception as e:
+            self.logger.error(e)
+            return {
+                "success": False,
+                "message": str(e),
+                "data": {}}
         
         with open(target_path, "w") as file:
             file.write(json.dumps(result_json))
         
         return {
             "success": True,
-            "message": msg,
+            "message": "success",
             "data": target_path}
+
+    def _detect_client(self, url, model):
+        # 每个检测接口一个客户端，同时在途请求数和批量大小按模型配置
+        if url not in self.detect_clients:
+            concurrency = self.cfg.get("detect_concurrency", {}).get(model, 8)
+            batch_cfg = self.cfg.get("detect_batch", {}).get(model, {})
+            self.detect_clients[url] = DetectClient(url, self.get_image, concurrency=concurrency,
+                                                    batch_size=batch_cfg.get("size", 1),
+                                                    batch_mode=batch_cfg.get("mode", "json"),
+                                                    max_batch_failures=batch_cfg.get("max_failures", 3),
+                                                    logger=self.logger)
+        return self.detect_clients[url]
     
     # 本地模型推理
     def local_infer(self, data_path, target_path):
@@ -1007,8 +1071,12 @@ class App_fun():
         try:
             
             data_path = os.path.abspath(data_path)
-            ret = self.load_local_model(self.path_model, data_path)
-            result_json = self._load_local_json(os.path.join(self.path_model, "result/result.json"))
+            if self.cfg.get("local_worker", {}).get("enable", True):
+                # 常驻推理进程，模型只加载一次
+                result_json = self._get_local_worker().infer(data_path)
+            else:
+                ret = self.load_local_model(self.path_model, data_path)
+                result_json = self._load_local_json(os.path.join(self.path_model, "result/result.json"))
             
             with open(target_path, "w") as f:
                 f.write(json.dumps(result_json))
@@ -1024,6 +1092,19 @@ class App_fun():
             "message": "success",
             "data": target_path}
     
+    def _get_local_worker(self):
+        if self.local_worker is None or self.local_worker.path_model != os.path.abspath(self.path_model):
+            self._close_local_worker()
+            self.local_worker = LocalModelWorker(self.path_model,
+                                                 python=self.cfg.get("local_worker", {}).get("python", "python"),
+                                                 logger=self.logger)
+        return self.local_worker
+
+    def _close_local_worker(self):
+        if self.local_worker is not None:
+            self.local_worker.close()
+            self.local_worker = None
+
     def load_local_model(self, path_model, data_path):
         self.logger.info("load model path: {}, data path：{}".format(path_model, data_path))
         cmd = "cd {} && python test.py {}".format(path_model, data_path) # && 可以先后执行两条shell命令
@@ -1066,69 +1147,23 @@ class App_fun():
         path_noise_data = os.path.join(self.path_task, self.cfg["data"]["data_noise"])
         self._mkdir_path(path_noise_data)
         path_ssim = os.path.join(self.path_task, self.cfg["data"]["data_noise"],"ssim.json")
+        if data_client["run_type"] == 0:
+            # 代码添加只生成单一噪声图，没有噪声强度名字典和ssim分数，扰动样本生成引擎不支持
+            self.logger.error("失败添加噪声，错误信息：不支持代码添加噪声")
+            print("--NO：失败添加噪声，错误信息：不支持代码添加噪声，请使用数值添加")
+            return {
+                "success": False,
+                "message": "run_type 0 (code) is not supported, use run_type 1 (interference).",
+                "data": {
+                    "code": 11 # 代表添加噪声方式不支持
+                }}
         try:
-            # 读取原始图片
-            image_list = os.listdir(path_basic_data)
-            print("----num of image: " + str(len(image_list)))
-            self.logger.info("num of image: " + str(len(image_list)))
-            ssim_score_dic={}
-            # 循环处理图片
-            for ii, image_name in enumerate(image_list):
-                
-                image_path = os.path.join(path_basic_data, image_name)
-                image = cv2.imread(image_path)
-
-                # 添加噪声
-                if data_client["run_type"] == 0:
-                    # 代码添加
-                    image_noised, noise_name = self.noiseCode(data_client["code"], image)
-                else:
-                    # 数值添加
-                    #image_noised, noise_name = noiseSingleimg(img=image, interference=data_client["interference"])
-                    noise_imgdic, noise_intensitydic = noiseSingleimg_sec(img=image, interference=data_client["interference"])
-                
-                #目前只写了数值添加
-                if ii == 0:
-                    print("添加噪声强度：" + str(noise_intensitydic["allnoise"]))
-                ssim_score_dic_perimg={}
-                for key,value in noise_intensitydic.items():
-                    for k in range(len(value)):
-                        noise_path = os.path.join(path_noise_data, value[k])
-                        if ii == 0:
-                            # 检查历史噪声工况，避免重复执行
-                            if os.path.exists(noise_path):
-                                self.logger.info("存在历史噪声工况" + value[k])
-                                print("存在历史噪声工况" + str(value[k]))
-                                continue
-                            else:
-                                self._mkdir_path(noise_path)
-                        cv2.imwrite(os.path.join(noise_path, image_name), noise_imgdic[key][k]) 
-                        if key != "allnoise":
-                            if k ==  len(value) - 1:
-                                image1 = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                                image2 = cv2.cvtColor(noise_imgdic[key][k], cv2.COLOR_BGR2GRAY)
-                                ssim_score = ssim(image1, image2)
-                                ssim_score_dic_perimg[key]=ssim_score
-                ssim_score_dic[image_name]=ssim_score_dic_perimg
-    
-                '''
-                # 创建噪声文件夹
-                if i == 0:
-                    noise_path = os.path.join(path_noise_data, noise_name)
-                    # 检查历史噪声工况，避免重复执行
-                    if os.path.exists(noise_path):
-                        self.logger.info("存在历史噪声工况" + noise_name)
-                        return {
-                            "success": True,
-                            "message": "there exists the history data.",
-                            "data": noise_name}
-                    else:
-                        self._mkdir_path(noise_path)
-                
-                cv2.imwrite(os.path.join(noise_path, image_name), image_noised)
-                '''
-            with open(path_ssim, "w") as file:
-                file.write(json.dumps(ssim_score_dic))
+            # 数值添加，图片分片后由扰动样本生成引擎并行处理
+            ssim_score_prev = self._load_ssim_score(path_ssim)
+            ssim_score_dic, noise_intensitydic = self.noise_engine.run(path_basic_data, path_noise_data, data_client["interference"],
+                                                                       ssim_score_prev)
+            self._save_ssim_score(path_ssim, ssim_score_dic, ssim_score_prev)
+            self._refresh_noise_index(path_noise_data, noise_intensitydic)
             
         except Exception as e:
                 self.logger.error(e)
@@ -1179,63 +1214,13 @@ class App_fun():
         self._mkdir_path(path_noise_data)
         path_ssim = os.path.join(self.path_task, self.cfg["data"]["data_noise"],"ssim.json")
         try:
-            # 读取原始图片
-            image_list = os.listdir(path_basic_data)
-            self.logger.info("num of image: " + str(len(image_list)))
-            ssim_score_dic={}
-            # 循环处理图片
-            for ii, image_name in enumerate(image_list):
-                
-                image_path = os.path.join(path_basic_data, image_name)
-                image = cv2.imread(image_path)
-
-                # 预设工况添加噪声
-                pre_interference = self.cfg["preConditions"][int(conditionId)]["interference"]
-                # print(pre_interference)
-                noise_imgdic, noise_intensitydic = noiseSingleimg_sec(img=image, interference=pre_interference)
-                
-                #目前只写了数值添加
-                if ii == 0:
-                    print("添加噪声强度：" + str(noise_intensitydic["allnoise"]))
-                ssim_score_dic_perimg={}
-                for key,value in noise_intensitydic.items():
-                    for k in range(len(value)):
-                        noise_path = os.path.join(path_noise_data, value[k])
-                        if ii == 0:
-                            # 检查历史噪声工况，避免重复执行
-                            if os.path.exists(noise_path):
-                                self.logger.info("存在历史噪声工况" + value[k])
-                                print("存在历史噪声工况" + str(value[k]))
-                                continue
-                            else:
-                                self._mkdir_path(noise_path)
-                        cv2.imwrite(os.path.join(noise_path, image_name), noise_imgdic[key][k]) 
-                        if key != "allnoise":
-                            if k ==  len(value) - 1:
-                                image1 = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                                image2 = cv2.cvtColor(noise_imgdic[key][k], cv2.COLOR_BGR2GRAY)
-                                ssim_score = ssim(image1, image2)
-                                ssim_score_dic_perimg[key]=ssim_score
-                ssim_score_dic[image_name]=ssim_score_dic_perimg
-    
-                '''
-                # 创建噪声文件夹
-                if i == 0:
-                    noise_path = os.path.join(path_noise_data, noise_name)
-                    # 检查历史噪声工况，避免重复执行
-                    if os.path.exists(noise_path):
-                        self.logger.info("存在历史噪声工况" + noise_name)
-                        return {
-                            "success": True,
-                            "message": "there exists the history data.",
-                            "data": noise_name}
-                    else:
-                        self._mkdir_path(noise_path)
-                
-                cv2.imwrite(os.path.join(noise_path, image_name), image_noised)
-                '''
-            with open(path_ssim, "w") as file:
-                file.write(json.dumps(ssim_score_dic))
+            # 预设工况添加噪声
+            pre_interference = self.cfg["preConditions"][int(conditionId)]["interference"]
+            ssim_score_prev = self._load_ssim_score(path_ssim)
+            ssim_score_dic, noise_intensitydic = self.noise_engine.run(path_basic_data, path_noise_data, pre_interference,
+                                                                       ssim_score_prev)
+            self._save_ssim_score(path_ssim, ssim_score_dic, ssim_score_prev)
+            self._refresh_noise_index(path_noise_data, noise_intensitydic)
             
         except Exception as e:
                 self.logger.error(e)
@@ -1256,6 +1241,237 @@ class App_fun():
             "ssim_score_path": path_ssim
             }
 
+    # 生成扰动样本的同时进行推理
+    def generate_infer(self, data_client):
+        """
+        @description  : 流水线方式生成扰动样本并推理，每生成一批图片即送入模型推理，噪声生成与模型推理重叠执行
+        ---------
+        @data_client  :
+         interference : 噪声强度
+        -------
+        @Returns      :
+               success: 成功与否
+               message: 详细信息
+                 noise: 扰动样本地址
+        ssim_score_path: ssim分数json文件地址
+        -------
+        """
+        if self.path_task == "":
+            self.path_task = "./db/a44d481e-29b5-48a2-9fa0-b3e0f24ef980/26d4d437-d82a-4629-94fb-5ea3dca88f40/task1"
+            print("Set path_task = ./db/a44d481e-29b5-48a2-9fa0-b3e0f24ef980/26d4d437-d82a-4629-94fb-5ea3dca88f40/task1")
+
+        # 创建文件树
+        path_basic_data = os.path.join(self.path_task, self.cfg["data"]["data_image"], "samples")
+        path_noise_data = os.path.join(self.path_task, self.cfg["data"]["data_noise"])
+        path_result_data = os.path.join(self.path_task, self.cfg["data"]["data_result"])
+        path_stream = os.path.join(path_noise_data, ".stream")
+        self._mkdir_path(path_noise_data)
+        self._mkdir_path(path_result_data)
+        path_ssim = os.path.join(path_noise_data, "ssim.json")
+
+        stream_cfg = self.cfg.get("stream", {})
+        chunk_images = stream_cfg.get("chunk_images", 256)
+        chunk_queue = queue.Queue(maxsize=stream_cfg.get("queue_size", 4)) # 有界队列，推理跟不上时阻塞噪声生成
+        state = {"plan": None, "names": []}
+        stop = threading.Event() # 推理出错后置位，生成线程不再向队列放入分块
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def on_chunk(noise_intensitydic, image_names):
+            state["plan"] = noise_intensitydic
+            state["names"].extend(image_names)
+            if len(state["names"]) >= chunk_images:
+                put((noise_intensitydic, state["names"]))
+                state["names"] = []
+
+        def produce():
+            try:
+                state["ssim_prev"] = self._load_ssim_score(path_ssim)
+                state["ssim"], state["noise"] = self.noise_engine.run(path_basic_data, path_noise_data, data_client["interference"],
+                                                                      state["ssim_prev"], on_chunk=on_chunk)
+                if len(state["names"]) > 0:
+                    put((state["plan"], state["names"]))
+            except Exception as e:
+                state["error"] = e
+            finally:
+                put(None)
+
+        # 没有常驻推理进程或检测接口时每次推理都要重新加载模型，不按分块推理，噪声生成结束后每个噪声文件夹推理一次
+        stream_infer = self._resident_infer()
+        if not stream_infer:
+            self.logger.info("没有常驻推理进程，噪声生成结束后按噪声文件夹推理")
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        results = {} # 噪声强度名 -> 推理结果
+        try:
+            try:
+                k = 0
+                while True:
+                    item = chunk_queue.get()
+                    if item is None:
+                        break
+                    # 容器内常驻推理进程中途不可用时，剩余分块也改为生成结束后按文件夹推理
+                    stream_infer = stream_infer and self._resident_infer()
+                    if not stream_infer:
+                        continue
+                    noise_intensitydic, image_names = item
+                    for noise_name in self._stream_noise_names(noise_intensitydic, path_result_data):
+                        results.setdefault(noise_name, {})
+                        self._infer_stream_chunk(path_noise_data, path_stream, noise_name, image_names, k, results[noise_name])
+                    k += 1
+            finally:
+                # 推理出错时清空队列，生成线程不会阻塞在put上；等待生成结束，已生成的噪声图的ssim分数仍然保存，下次增量生成时复用
+                stop.set()
+                while True:
+                    try:
+                        chunk_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                producer.join()
+                if "ssim" in state:
+                    self._save_ssim_score(path_ssim, state["ssim"], state["ssim_prev"])
+                    self._refresh_noise_index(path_noise_data, state["noise"])
+            if "error" in state:
+                raise state["error"]
+
+            noise_intensitydic = state["noise"]
+
+            # 增量生成时未重新生成的图片不经过流水线，以及没有常驻推理进程时的全部图片，在此按噪声文件夹推理
+            for noise_name in self._stream_noise_names(noise_intensitydic, path_result_data):
+                results.setdefault(noise_name, {})
+                rest = [name for name in self._get_file_index().names(os.path.join(path_noise_data, noise_name)) if name not in results[noise_name]]
+                if len(rest) > 0:
+                    self._infer_stream_chunk(path_noise_data, path_stream, noise_name, rest, k, results[noise_name])
+
+            for noise_name, result in results.items():
+                result_json = {
+                    "input_data_type": "RGB",
+                    "output_data_type": "bounding_box",
+                    "results": {key: result[key] for key in sorted(result)}}
+                with open(os.path.join(path_result_data, noise_name + ".json"), "w") as file:
+                    file.write(json.dumps(result_json))
+                self._prewarm_overlays(os.path.join(path_noise_data, noise_name), os.path.join(path_result_data, noise_name + ".json"))
+        except Exception as e:
+            self.logger.error(e)
+            print("--NO：失败生成并推理扰动样本")
+            return {
+                "success": False,
+                "message": str(e),
+                "data": {
+                    "code": 10 # 代表其他可能的错误
+                }}
+        finally:
+            shutil.rmtree(path_stream, ignore_errors=True)
+
+        path_json = os.path.join(self.path_task, 'info.json')
+        with open(path_json, 'r') as f:
+            info = json.load(f)
+        key = 'result'
+        history_noise = noise_intensitydic["allnoise"][0]
+        if key in info:
+            if history_noise not in info[key]:
+                info[key].append(history_noise)
+        else:
+            info[key] = [history_noise]
+        with open(path_json, 'w') as f:
+            json.dump(info, f, indent=4)
+
+        self.logger.info("成功生成并推理扰动样本")
+        print("--OK：成功生成并推理扰动样本")
+        return {
+            "success": True,
+            "message": "success",
+            "noise": noise_intensitydic,
+            "ssim_score_path": path_ssim
+            }
+
+    def _stream_noise_names(self, noise_intensitydic, path_result_data):
+        # 去重，并跳过已有历史测试结果的噪声强度
+        noise_names = []
+        for value in noise_intensitydic.values():
+            for noise_name in value:
+                if noise_name not in noise_names and not os.path.exists(os.path.join(path_result_data, noise_name + ".json")):
+                    noise_names.append(noise_name)
+        return noise_names
+
+    def _infer_stream_chunk(self, path_noise_data, path_stream, noise_name, image_names, k, result):
+        """
+        @description  : 将一批噪声图链接到临时文件夹后推理，结果合并到result
+        -------
+        """
+        path_chunk = os.path.join(path_stream, noise_name, str(k))
+        self._mkdir_path(path_chunk)
+        for image_name in image_names:
+            path_src = os.path.join(path_noise_data, noise_name, image_name)
+            path_dst = os.path.join(path_chunk, image_name)
+            try:
+                os.link(path_src, path_dst)
+            except OSError:
+                shutil.copyfile(path_src, path_dst)
+        json_path = os.path.join(path_stream, noise_name, str(k) + ".json")
+        res = self._infer(path_chunk, json_path)
+        if not res["success"]:
+            raise RuntimeError(res["message"])
+        with open(json_path, 'r') as file:
+            result.update(json.load(file)["results"])
+        shutil.rmtree(path_chunk, ignore_errors=True)
+        os.remove(json_path)
+
+    def _resident_infer(self):
+        """
+        @description  : 当前推理方式的模型是否常驻(容器内常驻推理进程、本地常驻推理进程或检测接口)，
+                        否则每次推理都会重新加载模型
+        -------
+        """
+        if self.use_docker:
+            if self.docker_container is None:
+                self._lease_docker_container(create=True)
+            return self.docker_entry is not None and self.docker_entry.worker is not None
+        if self.use_local_model:
+            return self.cfg.get("local_worker", {}).get("enable", True)
+        return True
+
+    def _infer(self, path_data, json_path):
+        # 按测试类型选择推理方式
+        if self.use_docker:
+            return self.run_docker_image(path_data, json_path)
+        if self.use_local_model:
+            return self.local_infer(path_data, json_path)
+        return self.model_infer(path_data, json_path, self.model_name)
+
+    def _load_ssim_score(self, path_ssim):
+        # 已有的ssim分数，增量生成时只更新新生成图片的条目
+        if not os.path.exists(path_ssim):
+            return {}
+        with open(path_ssim, 'r') as f:
+            return json.load(f)
+
+    def _get_file_index(self):
+        if self.file_index is None or self.file_index.path_task != self.path_task:
+            self.file_index = FileIndex(self.path_task)
+        return self.file_index
+
+    def _refresh_noise_index(self, path_noise_data, noise_intensitydic):
+        # 生成噪声后重建各噪声强度目录的索引
+        path_dirs = [os.path.join(path_noise_data, noise_name)
+                     for noise_name in sorted(set(name for value in noise_intensitydic.values() for name in value))]
+        self._get_file_index().refresh_many([path_dir for path_dir in path_dirs if os.path.isdir(path_dir)])
+
+    def _save_ssim_score(self, path_ssim, ssim_score_dic, ssim_score_prev=None):
+        # ssim.json供增量生成使用，统计量供ret_SSIM_score直接读取。分数没有变化(增量生成没有新图片)时不重写；
+        # 有变化时整体重写，分位数需要全部分数，被替换图片的旧分数也无法从最值中减去
+        store = SsimStore(os.path.dirname(path_ssim))
+        if ssim_score_dic == ssim_score_prev and store.exists():
+            return
+        write_json(path_ssim, ssim_score_dic)
+        store.write(ssim_score_dic)
+
     # 代码添加噪声
     def noiseCode(self, code, image):
         """
@@ -1355,9 +1571,9 @@ class App_fun():
         #     self.use_local_model = False
         
         try:
-            result_path = os.path.join(path_result_data, noise_name)
+            json_path = os.path.join(path_result_data, noise_name + ".json")
             # 检查历史工况，避免重复执行
-            if os.path.exists(result_path):
+            if os.path.exists(json_path):
                 self.logger.info("存在历史噪声测试结果: " + noise_name)
                 return {
                     "success": True,
@@ -1372,25 +1588,17 @@ class App_fun():
                         "message": "No corresponding noise data.",
                         "data": {}}
                     
-                # 模型推理
-                json_path = os.path.join(path_result_data, noise_name + ".json")
-                if self.use_docker:
-                    res = self.run_docker_image(path_noise_data, json_path)
-                else:
-                    if self.use_local_model:
-                        res = self.local_infer(path_noise_data, json_path)
-                    else:
-                        res = self.model_infer(path_noise_data, json_path, self.model_name)
-                
-                self._mkdir_path(result_path)
-                
-                with open(json_path, 'r') as file:
-                    data = json.load(file)
-                
-                for key, value in data["results"].items():
-                    image = cv2.imread(os.path.join(path_noise_data, key))
-                    image_result = ret_result_image(value, image)
-                    cv2.imwrite(os.path.join(result_path, key), image_result)
+                # 模型推理，结果图在查看时按需绘制
+                res = self._infer(path_noise_data, json_path)
+                if not res["success"]:
+                    self.logger.error("噪声样本推理失败: " + noise_name)
+                    return {
+                        "success": False,
+                        "message": res["message"],
+                        "data": {
+                            "code": 10 # 代表其他可能的错误
+                        }}
+                self._prewarm_overlays(path_noise_data, json_path)
                     
                 # ------------------------------------------------------------
 
@@ -1461,9 +1669,9 @@ class App_fun():
                     self._mkdir_path(path_result_data)
             
                     try:
-                        result_path = os.path.join(path_result_data, noise_name)
+                        json_path = os.path.join(path_result_data, noise_name + ".json")
                         # 检查历史工况，避免重复执行
-                        if os.path.exists(result_path):
+                        if os.path.exists(json_path):
                             self.logger.info("存在历史噪声测试结果: " + noise_name)
                             print("存在历史噪声测试结果: " + noise_name)
                         else:
@@ -1477,27 +1685,10 @@ class App_fun():
                                         "code": 7 # 代表生成用于计算二级指标的中间文件时,没有对应强度的噪声添加文件
                                     }}
                                 
-                            # 模型推理
-                            json_path = os.path.join(path_result_data, noise_name + ".json")
-                            
-                            if self.use_docker:
-                                res = self.run_docker_image(path_noise_data, json_path)
-                            else:
-                                if self.use_local_model:
-                                    res = self.local_infer(path_noise_data, json_path)
-                                else:
-                                    res = self.model_infer(path_noise_data, json_path, self.model_name)
-                            
-                            self._mkdir_path(result_path)
-                            
-                            with open(json_path, 'r') as file:
-                                data = json.load(file)
-                            
-                            for key_, value_ in data["results"].items():
-                                image = cv2.imread(os.path.join(path_noise_data, key_))
-                                image_result = ret_result_image(value_, image)
-                                cv2.imwrite(os.path.join(result_path, key_), image_result)
-                                
+                            # 模型推理，二级指标只用到推理结果json，不绘制结果图
+                            res = self._infer(path_noise_data, json_path)
+                            if not res["success"]:
+                                raise RuntimeError(res["message"])
 
                     except Exception as e:
                         self.logger.error(e)
@@ -1575,16 +1766,12 @@ class App_fun():
               img_list: 五张噪声推理结果图
         -------
         """
-        path_img_list = os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name)
-        noise_img_files = os.listdir(path_img_list)
+        path_noise_data = os.path.join(self.path_task, self.cfg["data"]["data_noise"], noise_name)
+        path_json = os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name + ".json")
         img_list = []
-        #print(noise_img_files)
-        if len(noise_img_files)>5: #抽取五张
-            noise_img_files = random.sample(noise_img_files,5)
-        #print(noise_img_files)
         try:
-            for img in noise_img_files:
-                path_img = os.path.join(path_img_list,img)
+            for img in self._sample_noise_names(path_noise_data): #抽取五张
+                path_img = self._overlay_image(os.path.join(path_noise_data, img), path_json)
                 image_noise = self.get_image(path_img)
                 img_list.append(image_noise)
             return{
@@ -1610,30 +1797,25 @@ class App_fun():
     ''' 
     def ret_SSIM_score(self):
         """
-            @description  : 输入每张图中每类噪声的ssim分数json文件，对所有图片的ssim分数求均值
+            @description  : 返回每类噪声的ssim分数均值、分位数与直方图，直接读取生成噪声时计算好的统计量
             ---------
             @Returns      :
                   ssim_dic: 每类噪声的ssim分数均值
+               percentiles: 每类噪声的ssim分数分位数
+                histograms: 每类噪声的ssim分数直方图
             -------
         """
-        path_ssim = os.path.join(self.path_task, self.cfg["data"]["data_noise"],"ssim.json")
-        with open(path_ssim, 'r') as f:
-            info = json.load(f)
-        first_key = next(iter(info))
-        ssim_dic={}
-        for noise_name in info[first_key]:
-            ssim_dic[noise_name]=[]
-        for img_name in info:
-            value_dic = info[img_name]
-            for key_,value_ in value_dic.items():
-                for noise_name in ssim_dic:
-                    if key_ == noise_name:
-                        ssim_dic[noise_name].append(value_)
+        store = SsimStore(os.path.join(self.path_task, self.cfg["data"]["data_noise"]))
+        if not store.exists():
+            # 旧任务只有ssim.json，转换一次
+            store.write(self._load_ssim_score(os.path.join(self.path_task, self.cfg["data"]["data_noise"], "ssim.json")))
+        stats = store.stats()
+        ssim_dic = {noise_name: value["mean"] for noise_name, value in stats.items()}
         print(ssim_dic)
-        for noise_name, score_list in ssim_dic.items():
-            ssim_dic[noise_name]=sum(score_list)/len(score_list)
         return {
-            "ssim_dic": ssim_dic
+            "ssim_dic": ssim_dic,
+            "percentiles": {noise_name: value["percentiles"] for noise_name, value in stats.items()},
+            "histograms": {noise_name: value["histogram"] for noise_name, value in stats.items()}
         }
         
     def ret_fst_score(self, data_client):
@@ -1811,29 +1993,24 @@ class App_fun():
             print("Set path_task = ./db/a44d481e-29b5-48a2-9fa0-b3e0f24ef980/26d4d437-d82a-4629-94fb-5ea3dca88f40/task1")
 
         # 噪声图片
+        file_index = self._get_file_index()
         path_noise_data = os.path.join(self.path_task, self.cfg["data"]["data_noise"], noise_name)
-        if not 0 <= index < len(os.listdir(path_noise_data)):
+        if not 0 <= index < file_index.count(path_noise_data):
             print("index is not allowed, make it 0")
             index = 0
-        image_noise_path = os.path.join(path_noise_data, sorted(os.listdir(path_noise_data))[index])
+        image_noise_path = os.path.join(path_noise_data, file_index.name(path_noise_data, index))
         # print(image_noise_path)
 
         # 原始图片
         data_samples = os.path.join(self.path_task, self.cfg["data"]["data_image"], "samples")
-        image_org_path = os.path.join(data_samples, sorted(os.listdir(data_samples))[index])
+        image_org_path = os.path.join(data_samples, file_index.name(data_samples, index))
         # print(image_org_path)
 
-        # 测试结果图片
-        path_result_data = os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name)
-        image_result_path = os.path.join(path_result_data, sorted(os.listdir(path_result_data))[index])
-        # print(image_result_path)
-
-        # 原图推理结果
-        data_results = os.path.join(self.path_task, self.cfg["data"]["data_image"], "results")
-        org_image_result_path = os.path.join(data_results, sorted(os.listdir(data_results))[index])
-        # print(org_image_result_path)
-
         try:
+            # 测试结果图片与原图推理结果，按需绘制
+            image_result_path = self._overlay_image(image_noise_path, os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name + ".json"))
+            org_image_result_path = self._overlay_image(image_org_path, os.path.join(self.path_task, self.cfg["data"]["data_image"], "label.json"))
+
             image_noise = self.get_image(image_noise_path)
             org_image_result = self.get_image(org_image_result_path)
             image_org = self.get_image(image_org_path)
@@ -1859,6 +2036,100 @@ class App_fun():
                     "code": 10 # 其他错误信息
                 }}
     
+    def _load_results(self, path_json):
+        # 推理结果json按修改时间缓存在内存中，查看结果图时不重复解析
+        mtime = os.stat(path_json).st_mtime_ns
+        cached = self.result_jsons.get(path_json)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, self._load_local_json(path_json)["results"])
+            self.result_jsons[path_json] = cached
+        return cached[1]
+
+    def _overlay_image(self, path_image, path_json):
+        """
+        @description  : 返回绘制了推理结果的图片路径，首次查看时绘制并缓存，没有推理结果的图片返回原图
+        ---------
+        @params       :
+           path_image : 噪声图或原图路径
+            path_json : 对应的推理结果json
+        -------
+        """
+        results = self._load_results(path_json)
+        name = os.path.basename(path_image)
+        if name not in results:
+            return path_image
+        return self.overlay_cache.get(path_image, results[name], ret_result_image)
+
+    def _sample_noise_names(self, path_noise_data, k=5):
+        # 固定种子抽样，预热的图片即为展示的图片
+        names = self._get_file_index().names(path_noise_data)
+        if len(names) > k:
+            names = random.Random(self.cfg.get("overlay", {}).get("seed", 0)).sample(names, k)
+        return names
+
+    def _prewarm_overlays(self, path_noise_data, path_json):
+        """
+        @description  : 推理完成后只绘制ret_noise_img展示的抽样图片，overlay.prewarm为false时全部推迟到查看时
+        -------
+        """
+        if not self.cfg.get("overlay", {}).get("prewarm", True):
+            return
+        for name in self._sample_noise_names(path_noise_data):
+            try:
+                self._overlay_image(os.path.join(path_noise_data, name), path_json)
+            except Exception as e:
+                self.logger.error(e)
+
+    def export_result_images(self, data_client):
+        """
+        @description  : 导出噪声样本的全部推理结果图，用于报告归档
+        ---------
+        @data_client  :
+      noise_name_list: 噪声强度名列表
+              quality: JPEG质量，默认overlay.export_quality
+             max_side: 长边超过该值时缩小，用于缩略图，默认不缩放
+        -------
+        @Returns      :
+               success: 成功与否
+               message: 详细信息
+                  data: 噪声强度名 -> 导出目录
+        -------
+        """
+        overlay_cfg = self.cfg.get("overlay", {})
+        quality = int(data_client.get("quality", overlay_cfg.get("export_quality", 95)))
+        max_side = data_client.get("max_side", overlay_cfg.get("export_max_side"))
+        max_side = int(max_side) if max_side else None
+        path_result_data = os.path.join(self.path_task, self.cfg["data"]["data_result"])
+        path_export = os.path.join(path_result_data, "export" if max_side is None else "export_" + str(max_side))
+        export_dirs = {}
+        try:
+            for noise_name in data_client["noise_name_list"]:
+                path_noise_data = os.path.join(self.path_task, self.cfg["data"]["data_noise"], noise_name)
+                results = self._load_results(os.path.join(path_result_data, noise_name + ".json"))
+                items = ((os.path.join(path_noise_data, name), results.get(name)) for name in self._get_file_index().names(path_noise_data))
+                dir_out = os.path.join(path_export, noise_name)
+                count = render_all(items, dir_out, ret_result_image,
+                                   workers=overlay_cfg.get("export_workers"),
+                                   max_inflight=overlay_cfg.get("export_max_inflight"),
+                                   quality=quality, max_side=max_side)
+                self.logger.info("导出推理结果图" + noise_name + ": " + str(count) + "张")
+                export_dirs[noise_name] = dir_out
+        except Exception as e:
+            self.logger.error(e)
+            print("--NO：失败导出推理结果图")
+            return {
+                "success": False,
+                "message": str(e),
+                "data": {
+                    "code": 10 # 其他错误信息
+                }}
+
+        print("--OK：成功导出推理结果图")
+        return {
+            "success": True,
+            "message": "success",
+            "data": export_dirs}
+
     def get_image(self, image_path):
         image = cv2.imread(image_path)
         _, image_encode = cv2.imencode('.jpg', image)
@@ -1902,36 +2173,33 @@ class App_fun():
         # path_perform = os.path.join(self.path_task, self.cfg["data"]["data_perform"], noise_name)
         # self._mkdir_path(path_perform)
         
-        random_lab_path = os.path.join(self.path_task, self.cfg["data"]["data_image"], "random_label.json")         
         # with open(path_label, 'r', encoding='utf-8') as f:
         #     lab_label = json.load(f)
-        with open(path_gt, 'r', encoding='utf-8') as f:
-            gt_label = json.load(f)
-            
-        with open(os.path.join(self.path_task, "info.json"), 'r') as ff:
-            info = json.load(ff)
-        key_ = 'third_score'
-        # 如果键存在，则读取列表元素；如果不存在，则创建新的键并填入列表元素
-        if key_ in info and info[key_].get(noise_name,0) != 0:
-            score_info = info[key_][noise_name]
-        else:
-            if key_ not in info:
-                info[key_]={}
-            info[key_][noise_name]=[]
-            #每次抽样本的80%，计算三次求平均
-            for i in range(3):
-                random_lab={}
-                #随机抽80%写入临时json
-                random_key = random.sample(gt_label['results'].keys(), int(0.5*len(gt_label['results'])))
+        seed = self.cfg.get("scoring", {}).get("seed", 0)
+        try:
+            # 推理结果或真值变化时缓存键随之变化
+            cache_key = self.score_cache.key("third_score", [path_label, path_result], path_gt, seed, rounds=3)
+        except Exception as e:
+            self.logger.error(e)
+            print("--NO：失败计算三级指标")
+            return {
+                "success": False,
+                "message": str(e),
+                "data": {
+                        "code": 10 # 代表其他可能的错误
+                }}
+        score_info = self.score_cache.get(cache_key)
+        if score_info is None:
+            score_info = []
+            with open(path_gt, 'r', encoding='utf-8') as f:
+                gt_label = json.load(f)
+            #每次随机抽50%写入本轮独占的临时json，计算三次求平均
+            for random_key in bootstrap_keys(gt_label['results'], 3, 0.5, seed):
                 print("random_key:",random_key)
-                for key in random_key:
-                    random_lab[key]=gt_label['results'][key]
-                new_data = {"input_data_type": "RGB", "output_data_type": "bounding_box", "results": random_lab}
-                with open(random_lab_path, 'w') as f:
-                    json.dump(new_data, f, indent=4)
                 try:
-                    ret_json1 = self.calculator_basic_remote_sensing(path_label, random_lab_path) # 真值和加噪前
-                    ret_json2 = self.calculator_basic_remote_sensing(path_result, random_lab_path) # 真值和加噪后
+                    with self._label_subset_file(gt_label, random_key) as random_lab_path:
+                        ret_json1 = self.calculator_basic_remote_sensing(path_label, random_lab_path) # 真值和加噪前
+                        ret_json2 = self.calculator_basic_remote_sensing(path_result, random_lab_path) # 真值和加噪后
                     print("真值和加噪前" + str(ret_json1))
                     print("真值和加噪后" + str(ret_json2))
                     score_info.append({
@@ -1947,9 +2215,7 @@ class App_fun():
                         "data": {
                                 "code": 10 # 代表其他可能的错误
                         }}
-            info[key_][noise_name] = score_info
-            with open(os.path.join(self.path_task, "info.json"), 'w') as f:
-                json.dump(info, f, indent=4)  
+            self.score_cache.put(cache_key, score_info)
 
         
         # score_dic={}
@@ -1977,6 +2243,31 @@ class App_fun():
         ret_json = self.flash_ret(ret_json, ret)
         return ret_json
     
+    def _scoring_engine(self):
+        return self.cfg.get("scoring", {}).get("engine", "legacy")
+
+    @contextlib.contextmanager
+    def _label_subset_file(self, label, image_names):
+        """
+        @description  : 真值子集写入本次调用独占的临时文件，供只接受文件路径的RemoteSensingScore使用，用完即删除，
+                        同一任务的并发请求互不覆盖
+        ---------
+        @params       :
+                label : 已加载的真值
+          image_names : 子集图片名
+        -------
+        """
+        subset = {"input_data_type": "RGB", "output_data_type": "bounding_box",
+                  "results": {name: label["results"][name] for name in image_names}}
+        fd, path_subset = tempfile.mkstemp(prefix="random_label_", suffix=".json",
+                                           dir=os.path.join(self.path_task, self.cfg["data"]["data_image"]))
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(subset, f)
+            yield path_subset
+        finally:
+            os.remove(path_subset)
+
     def flash_ret(self, ret_json, result):
         for key_result, content in result.items():
             ret_json[key_result] = content
@@ -2000,18 +2291,9 @@ class App_fun():
         '''
         noise_name_dic = data_client["noise"]
         score_dic = {}
-        score_sec_dic1 = {}
-        score_sec_dic2 = {}
-        score_sec_dic3 = {}
-        score_sec_perlevel_dic1 = {}
-        score_sec_perlevel_dic2 = {}
-        score_sec_perlevel_dic3 = {}
-        score_sec_list=[score_sec_dic1,score_sec_dic2,score_sec_dic3]
-        score_sec_perlevel_list=[score_sec_perlevel_dic1,score_sec_perlevel_dic2,score_sec_perlevel_dic3]
+        # 自助抽样轮数，numpy引擎下每个结果只匹配一次，轮数可以取到上千
+        rounds = self.cfg.get("scoring", {}).get("bootstrap_rounds", 3)
         path_label = os.path.join(self.path_task, self.cfg["data"]["data_image"], "label.json")
-        random_lab_path = os.path.join(self.path_task, self.cfg["data"]["data_image"], "random_label.json")
-        with open(path_label, 'r', encoding='utf-8') as f:
-            lab_label = json.load(f)
         if "allnoise" in noise_name_dic:
             noise_name_ = noise_name_dic["allnoise"][0]
             del noise_name_dic["allnoise"]
@@ -2020,57 +2302,38 @@ class App_fun():
                 print("----" + str(key) + ": " + str(value[-1]))
             del value[-1]
         
-        with open(os.path.join(self.path_task, "info.json"), 'r') as ff:
-            info = json.load(ff)
-        key_ = 'second_score'
-        # 如果键存在，则读取列表元素；如果不存在，则创建新的键并填入列表元素
-        if key_ in info and info[key_].get(noise_name_,0) != 0:
-            score_sec_perlevel_list = info[key_][noise_name_]
-        else:
-            if key_ not in info:
-                info[key_]={}
-            info[key_][noise_name_]=[]
-        
-            #计算三次取平均
-            for i in range(3):
-                random_lab={}
-                #随机抽50%写入临时json
-                random_key = random.sample(lab_label['results'].keys(), int(0.5*len(lab_label['results'])))
-                # print("random_key:",random_key)
-                for _key_ in random_key:
-                    random_lab[_key_]=lab_label['results'][_key_]
-                new_data = {"input_data_type": "RGB", "output_data_type": "bounding_box", "results": random_lab}
-                with open(random_lab_path, 'w') as f:
-                    json.dump(new_data, f, indent=4)
-                for key, value in noise_name_dic.items():
-                    if value[0] == '00000000000000000':
-                        continue
-                    else:
-                        score_sec = 0             
-                        score_noise_img_list = []
-                        for noise_name in value:
-                            path_result = os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name  + ".json") 
-                            try:
-                                calculator = RemoteSensingScore(path_result, random_lab_path)
-                                per_img_map = float(calculator.mAP())
-                                score_noise_img_list.append(per_img_map)
-                            except Exception as e:
-                                self.logger.error(e)
-                                print("--NO：失败计算二级指标")
-                                return {
-                                    "success": False,
-                                    "message": str(e),
-                                    "data": {
-                                        "code": 10 # 代表其他可能的错误
-                                    }}
-                        # print("map_list:",score_noise_img_list)             
-                        score_sec = sum(score_noise_img_list)/len(score_noise_img_list)
-                        score_sec_perlevel_list[i][key] = score_noise_img_list
-                        score_sec_list[i][key] = score_sec
-
-            info[key_][noise_name_] = score_sec_perlevel_list
-            with open(os.path.join(self.path_task, "info.json"), 'w') as f:
-                json.dump(info, f, indent=4)
+        # (噪声类别, 噪声强度, 抽样轮次)并行计算，固定种子抽样，按固定顺序合并
+        scoring_cfg = self.cfg.get("scoring", {})
+        seed = scoring_cfg.get("seed", 0)
+        families = {key: value for key, value in noise_name_dic.items() if value[0] != '00000000000000000'}
+        path_results = {noise_name: os.path.join(self.path_task, self.cfg["data"]["data_result"], noise_name  + ".json")
+                        for value in families.values() for noise_name in value}
+        try:
+            # 推理结果或真值变化时缓存键随之变化
+            cache_key = self.score_cache.key("second_score", [path_results[n] for value in families.values() for n in value], path_label, seed,
+                                             rounds=rounds, engine=self._scoring_engine(), families=families)
+            cached = self.score_cache.get(cache_key)
+            if cached is not None:
+                score_sec_perlevel_list, score_sec_list = cached["sec_score"], cached["score_sec_list"]
+            else:
+                with open(path_label, 'r', encoding='utf-8') as f:
+                    lab_label = json.load(f)
+                score_sec_perlevel_list, score_sec_list = score_families(families, path_results, lab_label, rounds,
+                                                                         engine=self._scoring_engine(),
+                                                                         seed=seed,
+                                                                         executor=scoring_cfg.get("executor", "process"),
+                                                                         workers=scoring_cfg.get("workers"),
+                                                                         dir_tmp=os.path.join(self.path_task, self.cfg["data"]["data_image"]))
+                self.score_cache.put(cache_key, {"sec_score": score_sec_perlevel_list, "score_sec_list": score_sec_list})
+        except Exception as e:
+            self.logger.error(e)
+            print("--NO：失败计算二级指标")
+            return {
+                "success": False,
+                "message": str(e),
+                "data": {
+                    "code": 10 # 代表其他可能的错误
+                }}
                 
         print(noise_name_)
         '''
@@ -2115,6 +2378,26 @@ class App_fun():
         -------
         """
         print("Using docker.......")
+        if self.docker_container is None and self._lease_docker_container(create=True) is None:
+            return {
+                "success": False,
+                "message": "No docker container for this task, load the docker image first.",
+                "data": {
+                    "code": 10 # 代表其他可能的错误
+                }}
+        if self.docker_entry is not None and self.docker_entry.worker is not None:
+            try:
+                # 容器内常驻推理进程，模型已加载，每个文件夹只是一次请求
+                result_json = self.docker_entry.worker.infer("/data" + data_samples.split("/db")[-1])
+                with open(result_path, "w") as f:
+                    f.write(json.dumps(result_json))
+                return {
+                    "success": True,
+                    "message": "success",
+                    "data": ""}
+            except Exception as e:
+                self.logger.error("容器内常驻推理进程不可用，改用exec_run: " + str(e))
+                self._close_docker_worker(self.docker_entry)
         try:
             data_samples = data_samples.split("/db")[-1]
             cmd = ["python", "test.py", "/data" + data_samples]
@@ -2127,6 +2410,8 @@ class App_fun():
             self.get_files("/result/result.json", result_path)
         except Exception as e:
             self.logger.error(e)
+            # 容器异常，停止并从容器池中移除，下次推理时重新创建
+            self._discard_docker_container()
             return {
                 "success": False,
                 "message": str(e),
@@ -2136,6 +2421,111 @@ class App_fun():
             "message": "success",
             "data": s}
     
+    def _lease_docker_container(self, create=False):
+        """
+        @description  : 为当前任务重新租用其之前加载的镜像的容器，create为False时只复用容器池中保温的容器
+        -------
+        @Returns      :
+                entry : PooledContainer，没有加载过镜像或没有可复用的容器时返回None
+        -------
+        """
+        tag = self.docker_pool.tag_of(self.path_task)
+        if tag is None:
+            return None
+        entry = self.docker_pool.acquire(self.path_task, tag, self._create_container if create else None)
+        if entry is not None:
+            self.docker_entry = entry
+            self.docker_container = entry.container
+            self.model_name = tag
+        return entry
+
+    def _discard_docker_container(self):
+        self.docker_pool.discard(self.path_task)
+        self.docker_entry = None
+        self.docker_container = None
+
+    def _create_container(self, client, tag):
+        """
+        @description  : 启动白盒模型容器，供容器池调用
+        ---------
+        @params       :
+               client : docker客户端
+                  tag : 镜像名
+        -------
+        @Returns      :
+                entry : PooledContainer
+        -------
+        """
+        path_mount_dataset = os.path.join(self.cfg["sys_info"]["project_root"], self.cfg["data"]["user_data"])  # 将数据集挂载到docker中
+        # print("Path of mount: ", path_mount_dataset)
+        vol = ["{}:/data".format(path_mount_dataset)]
+        worker_cfg = self.cfg.get("docker_worker", {})
+        if worker_cfg.get("enable", True):
+            # 常驻推理进程的脚本以只读方式挂载到容器中
+            vol.append("{}:/robust_worker:ro".format(os.path.join(self.cfg["sys_info"]["project_root"], "src", "app")))
+        result_dir = None
+        if self.cfg.get("docker_result", {}).get("mount", False):
+            # 将容器的/result挂载到共享数据目录，推理结果直接写到宿主机
+            name_result = os.path.join(".results", uuid.uuid4().hex)
+            result_dir = os.path.join("./", self.cfg["data"]["user_data"], name_result)
+            self._mkdir_path(result_dir)
+            vol.append("{}:/result".format(os.path.join(path_mount_dataset, name_result)))
+
+        cmd_run_docker = '/bin/bash'
+        container = client.containers.run(tag,  # image_name 是我们docker镜像的name 
+                            detach=True,  # detach=True,是docker run -d 后台运行容器
+                            remove=True,  # 容器如果stop了，会自动删除容器
+                            tty=True,  # 分配一个tty  docker run -t
+                            volumes=vol,  # 与宿主机的共享目录， docker run -v /var/:/opt
+                            command=cmd_run_docker,
+                            device_requests=[docker.types.DeviceRequest(count=-1, capabilities=[['gpu']])]
+                            )  # The command to run in the container
+        entry = PooledContainer(tag, container)
+        entry.result_dir = result_dir
+        if worker_cfg.get("enable", True):
+            entry.worker = self._start_docker_worker(container, worker_cfg)
+        return entry
+
+    def _start_docker_worker(self, container, worker_cfg):
+        """
+        @description  : 在容器工作目录中后台启动model_worker.py，通过数据挂载目录中的unix socket通信
+        -------
+        @Returns      :
+               worker : SocketModelWorker，启动失败返回None
+        -------
+        """
+        try:
+            name_socket = container.id[:12] + ".sock"
+            path_sockets = os.path.join("./", self.cfg["data"]["user_data"], ".sockets")
+            self._mkdir_path(path_sockets)
+            path_socket = os.path.join(path_sockets, name_socket)
+            if os.path.exists(path_socket):
+                os.remove(path_socket)
+            # 用底层接口启动，保留exec id，等待socket时可查询进程是否已退出
+            api = container.client.api
+            exec_id = api.exec_create(container.id, ["python", "/robust_worker/model_worker.py", "--socket", "/data/.sockets/" + name_socket,
+                                                       "--result", "/result/result.json"])["Id"]
+            api.exec_start(exec_id, detach=True)
+            return SocketModelWorker(path_socket,
+                                     startup_timeout=worker_cfg.get("startup_timeout", 600),
+                                     is_running=lambda: api.exec_inspect(exec_id)["Running"],
+                                     logger=self.logger)
+        except Exception as e:
+            self.logger.error("容器内常驻推理进程启动失败，改用exec_run: " + str(e))
+            return None
+
+    def _close_docker_worker(self, entry):
+        if entry.worker is not None:
+            entry.worker.close()
+            if os.path.exists(entry.worker.path_socket):
+                os.remove(entry.worker.path_socket)
+            entry.worker = None
+
+    def _close_pooled_container(self, entry):
+        self._close_docker_worker(entry)
+        if entry.result_dir is not None:
+            shutil.rmtree(entry.result_dir, ignore_errors=True)
+
     def get_files(self, path_file_inDocker, path_file_Local):
         """
         @description         : 将docker中的文件复制到宿主机中
@@ -2153,16 +2543,16 @@ class App_fun():
             # cmd_get_doc = "docker cp {}:{} {}".format(id, path_file_inDocker, path_dir)
             # f = os.popen('echo %s|sudo -S %s' % (self.cfg["sys_info"]["psw"], cmd_get_doc))
 
-            path_dir = os.path.dirname(path_file_Local)
-            path_tar = os.path.join(path_dir, "result.tar")
-            f = open(path_tar, 'wb')
+            result_dir = self.docker_entry.result_dir if self.docker_entry is not None else None
+            if result_dir is not None and path_file_inDocker.startswith("/result/"):
+                # /result挂载在共享数据目录中，直接移动宿主机上的结果文件
+                shutil.move(os.path.join(result_dir, path_file_inDocker[len("/result/"):]), path_file_Local)
+                return 0
+
+            # 在内存中解码tar流，只写一次目标文件
             bits, stat = self.docker_container.get_archive(path_file_inDocker)
-            for chunk in bits:
-                f.write(chunk)
-            f.close()
-            with tarfile.open(path_tar, 'r') as f:
-                f.extractall(path_dir)
-            os.rename(os.path.join(path_dir, "result.json"), path_file_Local)
+            data = read_member(bits, os.path.basename(path_file_inDocker))
+            write_bytes(path_file_Local, data)
         except Exception as e:
             self.logger.error("复制文件错误")
             self.logger.error(e)
@@ -2278,8 +2668,6 @@ class App_fun():
         try:
             db_dir = os.path.join(self.path_task, self.cfg["data"]["data_image"])
             data_samples = os.path.join(self.path_task, self.cfg["data"]["data_image"], "samples")
-            data_results = os.path.join(self.path_task, self.cfg["data"]["data_image"], "results")
-            self._mkdir_path(data_results)
             
             # -----------------------------------------------------------
             # 模型推理
@@ -2297,30 +2685,15 @@ class App_fun():
                         self.logger.error("Can't find the image, some thing wrong with the path of docker")
                         return None
                     
-                    self.docker_client = docker.from_env()  # 创建一个docker客户端
-                    # 加载镜像
-                    with open(path_docker_, 'rb') as f:
-                        self.docker_image = self.docker_client.images.load(f)[0]
-                        
-                    self.model_name = self.docker_image.tags[0]
+                    # 加载镜像，镜像包内容相同时不重复加载
+                    self.model_name = self.docker_pool.load_image(path_docker_)
                 else:
                     self.model_name = path_docker
                 # print(self.model_name)
                 
-                path_mount_dataset = os.path.join(self.cfg["sys_info"]["project_root"], self.cfg["data"]["user_data"])  # 将数据集挂载到docker中
-                # print("Path of mount: ", path_mount_dataset)
-                vol = ["{}:/data".format(path_mount_dataset)]
-
-                self.docker_client = docker.from_env()  # 创建一个docker客户端
-                cmd_run_docker = '/bin/bash'
-                self.docker_container = self.docker_client.containers.run(self.model_name,  # image_name 是我们docker镜像的name 
-                                    detach=True,  # detach=True,是docker run -d 后台运行容器
-                                    remove=True,  # 容器如果stop了，会自动删除容器
-                                    tty=True,  # 分配一个tty  docker run -t
-                                    volumes=vol,  # 与宿主机的共享目录， docker run -v /var/:/opt
-                                    command=cmd_run_docker,
-                                    device_requests=[docker.types.DeviceRequest(count=-1, capabilities=[['gpu']])]
-                                    )  # The command to run in the container
+                # 每个任务租用自己的容器，同一镜像的空闲容器直接复用
+                self.docker_entry = self.docker_pool.acquire(self.path_task, self.model_name, self._create_container)
+                self.docker_container = self.docker_entry.container
                 self.logger.info('加载docker完成')
                 
                 res = self.run_docker_image(data_samples, result_path)
@@ -2334,14 +2707,7 @@ class App_fun():
                     # 黑盒
                     print("----黑盒测试......")
                     res = self.model_infer(data_samples, result_path,  path_docker)
-                    
-            with open(result_path, 'r') as file:
-                data = json.load(file)
-                
-            for key, value in data["results"].items():
-                image = cv2.imread(os.path.join(data_samples, key))
-                image_result = ret_result_image(value, image)
-                cv2.imwrite(os.path.join(data_results, key), image_result)
+            # 原图推理结果图在查看时按需绘制
             # ------------------------------------------------------------
                     
             if res["success"] == False:
@@ -377,6 +377,26 @@ def generate_Data():
    ret = app_fun.generate_data(data_client)
    return jsonify(ret)
 
+# 生成扰动样本并流水线推理
+@app.route("/robustness/generateInfer", methods=["POST"])
+def generate_Infer():
+   """
+   @description  : 生成扰动样本，每生成一批即送入模型推理
+   ---------
+   @data_client  :
+     interference: 噪声强度
+   -------
+   @Returns      :
+          success: 成功与否
+          message: 详细信息
+            noise: 扰动样本地址
+   -------
+   """
+   data_client = request.get_json()
+   print("\n--generateInfer:添加噪声并推理")
+   ret = app_fun.generate_infer(data_client)
+   return jsonify(ret)
+
 # 11 噪声样本测试结果
 @app.route("/robustness/retResult", methods=["GET"])
 def ret_Result():
@@ -462,6 +482,29 @@ def ret_noise_img():
    ret = app_fun.ret_noise_img(args["noise_name"])
    return jsonify(ret)
 
+# 导出全部噪声推理结果图
+@app.route("/robustness/exportResultImages", methods=["POST"])
+def export_Result_Images():
+   """
+   @description  : 导出噪声样本的全部推理结果图，用于报告归档
+   ---------
+   @param        :
+  noise_name_list: 噪声强度名列表
+          quality: JPEG质量
+         max_side: 缩略图长边
+   -------
+   @Returns      :
+          success: 成功与否
+          message: 详细信息
+             data: 噪声强度名 -> 导出目录
+   -------
+   """
+   data_client = request.get_json()
+   print("\n--exportResultImages:导出噪声推理结果图")
+   print("----" + str(data_client))
+   ret = app_fun.export_result_images(data_client)
+   return jsonify(ret)
+
 
 
 # 13 返回三级指标分数
@@ -0,0 +1,43 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 原子写文件,先写同目录下的唯一临时文件再os.replace,中断时不会留下不完整的文件,并发写入同一文件时互不覆盖临时文件
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, tempfile
+
+
+def replace_file(path, write, mode="w"):
+    """
+    @description  : 调用write(f)写入临时文件后替换path
+    ---------
+    @params       :
+                 path : 目标文件路径
+                write : 写入函数，参数为打开的临时文件
+                 mode : 打开方式，w或wb
+    -------
+    """
+    dir_path = os.path.dirname(os.path.abspath(path))
+    # 以.开头，文件索引与噪声生成都会跳过
+    fd, path_tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=dir_path)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.chmod(path_tmp, 0o644) # mkstemp创建的文件只有属主可读
+        os.replace(path_tmp, path)
+    except BaseException:
+        try:
+            os.remove(path_tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_json(path, data, **kwargs):
+    replace_file(path, lambda f: json.dump(data, f, **kwargs))
+
+
+def write_bytes(path, data):
+    replace_file(path, lambda f: f.write(data), mode="wb")
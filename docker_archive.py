@@ -0,0 +1,56 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 在内存中流式解析容器get_archive返回的tar数据,不在磁盘上落地tar包
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import io, os, tarfile
+
+
+class ChunkStream(io.RawIOBase):
+
+    def __init__(self, chunks) -> None:
+        """
+        @description  : 将get_archive返回的字节块迭代器包装为只读文件对象
+        ---------
+        @chunks       : bytes迭代器
+        -------
+        """
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            try:
+                self.buffer = next(self.chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+
+def read_member(chunks, name=None):
+    """
+    @description  : 顺序解码tar流，返回指定文件的内容
+    ---------
+    @params       :
+               chunks : get_archive返回的字节块迭代器
+                 name : 文件名(不含目录)，None时返回第一个普通文件
+    -------
+    @Returns      :
+                 data : 文件内容bytes
+    -------
+    """
+    with tarfile.open(fileobj=io.BufferedReader(ChunkStream(chunks), 1 << 20), mode="r|") as tar:
+        for member in tar:
+            if member.isfile() and (name is None or os.path.basename(member.name) == name):
+                return tar.extractfile(member).read()
+    raise FileNotFoundError("{} not found in archive".format(name))
+
@@ -0,0 +1,304 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 白盒模型的镜像缓存与容器池,同一镜像包只加载一次,每个任务独占一个容器,空闲容器保温复用
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, time, hashlib, threading
+from src.app.atomic_io import write_json
+
+
+def _default_client():
+    import docker
+    return docker.from_env()
+
+
+class PooledContainer():
+
+    def __init__(self, tag, container) -> None:
+        """
+        @description  : 容器池中的一个容器及其附属资源
+        ---------
+        @params       :
+                  tag : 镜像名
+            container : docker容器对象
+        -------
+        """
+        self.tag = tag
+        self.container = container
+        self.owner = None
+        self.last_used = time.time()
+        self.worker = None # 容器内的常驻推理进程
+        self.result_dir = None # 挂载为容器/result的宿主机目录
+
+
+class ContainerPool():
+
+    def __init__(self, state_dir, client_factory=None, max_idle=2, idle_timeout=1800, on_close=None, logger=None) -> None:
+        """
+        @description  : 镜像包按内容哈希去重加载，容器按任务租用，释放后按镜像名保温，超时或超过数量上限时停止
+        ---------
+        @params       :
+            state_dir : 镜像包哈希 -> 镜像名的索引目录
+       client_factory : 返回docker客户端的函数，测试时可传入StandInClient
+             max_idle : 最多保温的空闲容器数
+         idle_timeout : 空闲容器的最长保温时间(秒)
+             on_close : 停止容器前的回调，用于释放容器的附属资源
+               logger : 日志
+        -------
+        """
+        self.state_dir = state_dir
+        self.client_factory = client_factory or _default_client
+        self.max_idle = max(0, int(max_idle))
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close
+        self.logger = logger
+        self.client = None
+        self.leases = {} # 任务 -> PooledContainer
+        self.owner_tags = {} # 任务 -> 最近租用的镜像名，任务切换回来时重新租用
+        self.idle = [] # 按释放时间排序
+        self.digests = {} # (路径, 大小, 修改时间) -> 镜像包哈希，避免重复计算大文件哈希
+        self.lock = threading.RLock()
+        self.reaper = None
+        self.reaper_stop = threading.Event()
+
+    def start_reaper(self, interval=60):
+        """
+        @description  : 后台线程每interval秒淘汰一次超时的空闲容器，没有任务切换时空闲容器也会按时停止
+        -------
+        """
+        if self.reaper is not None or interval is None or interval <= 0:
+            return
+        self.reaper_stop.clear()
+
+        def reap():
+            while not self.reaper_stop.wait(interval):
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    self._log("淘汰空闲容器失败: " + str(e))
+
+        self.reaper = threading.Thread(target=reap, daemon=True)
+        self.reaper.start()
+
+    def _client(self):
+        if self.client is None:
+            self.client = self.client_factory()
+        return self.client
+
+    def _digest(self, path_tar):
+        stat = os.stat(path_tar)
+        key = (os.path.abspath(path_tar), stat.st_size, stat.st_mtime_ns)
+        if key not in self.digests:
+            h = hashlib.sha256()
+            with open(path_tar, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            self.digests[key] = h.hexdigest()
+        return self.digests[key]
+
+    def _load_index(self):
+        path_index = os.path.join(self.state_dir, "images.json")
+        if not os.path.exists(path_index):
+            return {}
+        with open(path_index, "r") as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        os.makedirs(self.state_dir, exist_ok=True)
+        write_json(os.path.join(self.state_dir, "images.json"), index)
+
+    def _image_exists(self, tag):
+        try:
+            self._client().images.get(tag)
+        except Exception: # docker.errors.ImageNotFound等，按不存在处理，重新加载
+            return False
+        return True
+
+    def load_image(self, path_tar):
+        """
+        @description  : 加载镜像包，内容相同且镜像仍存在时直接返回镜像名
+        -------
+        @Returns      :
+                  tag : 镜像名
+        -------
+        """
+        with self.lock:
+            digest = self._digest(path_tar)
+            index = self._load_index()
+            tag = index.get(digest)
+            if tag is not None and self._image_exists(tag):
+                self._log("镜像包已加载过，复用镜像: " + tag)
+                return tag
+            with open(path_tar, "rb") as f:
+                image = self._client().images.load(f)[0]
+            tag = image.tags[0]
+            index[digest] = tag
+            self._save_index(index)
+            self._log("加载镜像包完成: " + tag)
+            return tag
+
+    def acquire(self, owner, tag, create):
+        """
+        @description  : 为任务租用一个该镜像的容器，优先复用任务已租用的或空闲的容器
+        ---------
+        @params       :
+                owner : 任务标识
+                  tag : 镜像名
+               create : create(client, tag) -> PooledContainer，新建容器；为None时只复用已有容器
+        -------
+        @Returns      :
+                entry : PooledContainer，create为None且没有可复用的容器时返回None
+        -------
+        """
+        with self.lock:
+            self.evict_idle()
+            entry = self.leases.get(owner)
+            if entry is not None:
+                if entry.tag == tag:
+                    return entry
+                self.release(owner)
+            for i in range(len(self.idle) - 1, -1, -1):
+                if self.idle[i].tag == tag:
+                    entry = self.idle.pop(i)
+                    self._log("复用空闲容器: " + tag)
+                    break
+            else:
+                if create is None:
+                    return None
+                entry = create(self._client(), tag)
+                self._log("启动容器: " + tag)
+            entry.owner = owner
+            entry.last_used = time.time()
+            self.leases[owner] = entry
+            self.owner_tags[owner] = tag
+            return entry
+
+    def tag_of(self, owner):
+        """
+        @description  : 任务最近租用的镜像名，没有租用过返回None
+        -------
+        """
+        with self.lock:
+            return self.owner_tags.get(owner)
+
+    def release(self, owner):
+        """
+        @description  : 任务结束，容器放回空闲列表保温
+        -------
+        """
+        with self.lock:
+            entry = self.leases.pop(owner, None)
+            if entry is None:
+                return
+            entry.owner = None
+            entry.last_used = time.time()
+            self.idle.append(entry)
+            self.evict_idle()
+
+    def discard(self, owner):
+        """
+        @description  : 停止任务租用的容器，不再复用
+        -------
+        """
+        with self.lock:
+            entry = self.leases.pop(owner, None)
+            if entry is not None:
+                self._stop(entry)
+
+    def evict_idle(self):
+        with self.lock:
+            now = time.time()
+            keep = []
+            for entry in self.idle:
+                if now - entry.last_used > self.idle_timeout:
+                    self._stop(entry)
+                else:
+                    keep.append(entry)
+            while len(keep) > self.max_idle:
+                self._stop(keep.pop(0))
+            self.idle = keep
+
+    def close(self):
+        self.reaper_stop.set()
+        self.reaper = None
+        with self.lock:
+            for entry in list(self.leases.values()) + self.idle:
+                self._stop(entry)
+            self.leases = {}
+            self.idle = []
+
+    def _stop(self, entry):
+        if self.on_close is not None:
+            self.on_close(entry)
+        try:
+            entry.container.stop() # 容器以remove=True启动，停止后自动删除
+        except Exception as e:
+            self._log("停止容器失败: " + str(e))
+        self._log("停止容器: " + entry.tag)
+
+    def _log(self, msg):
+        if self.logger is not None:
+            self.logger.info(msg)
+
+
+class StandInClient():
+
+    def __init__(self) -> None:
+        """
+        @description  : 不依赖docker守护进程的替身客户端，镜像包内容的第一行为镜像名，供测试容器池使用
+        -------
+        """
+        self.images = _StandInImages()
+        self.containers = _StandInContainers()
+
+
+class _StandInImage():
+
+    def __init__(self, tag) -> None:
+        self.tags = [tag]
+
+
+class _StandInImages():
+
+    def __init__(self) -> None:
+        self.loaded = {}
+        self.load_count = 0
+
+    def load(self, f):
+        tag = f.readline().decode().strip()
+        self.load_count += 1
+        self.loaded[tag] = _StandInImage(tag)
+        return [self.loaded[tag]]
+
+    def get(self, tag):
+        if tag not in self.loaded:
+            raise LookupError("No such image: " + tag)
+        return self.loaded[tag]
+
+
+class _StandInContainer():
+
+    def __init__(self, tag, kwargs) -> None:
+        self.id = hashlib.sha256(os.urandom(16)).hexdigest()
+        self.image = tag
+        self.kwargs = kwargs
+        self.running = True
+
+    def exec_run(self, cmd, stream=False, detach=False):
+        return 0, iter([b""]) if stream else b""
+
+    def stop(self):
+        self.running = False
+
+
+class _StandInContainers():
+
+    def __init__(self) -> None:
+        self.started = []
+
+    def run(self, tag, **kwargs):
+        self.started.append(_StandInContainer(tag, kwargs))
+        return self.started[-1]
@@ -0,0 +1,222 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 数据集并发下载,流式写盘,失败重试,下载清单支持断点续传
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, time, requests
+from src.app.atomic_io import write_json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+
+class Downloader():
+
+    def __init__(self, concurrency=8, retries=3, backoff=0.5, timeout=60, chunk_size=1 << 16, logger=None) -> None:
+        """
+        @description  : 并发下载器，keep-alive会话，最多concurrency个下载同时进行
+        ---------
+        @params       :
+          concurrency : 同时进行的最大下载数
+              retries : 失败后的最大重试次数
+              backoff : 第i次重试前等待backoff * 2**i秒
+              timeout : 连接/读取超时时间(秒)
+           chunk_size : 流式写盘的块大小
+               logger : 日志
+        -------
+        """
+        self.concurrency = max(1, int(concurrency))
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.logger = logger
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def download(self, url, path_file):
+        """
+        @description  : 流式下载到临时文件，完成后重命名，中断时不会留下不完整的目标文件
+        -------
+        @Returns      :
+                 size : 文件字节数
+        -------
+        """
+        path_tmp = path_file + ".part"
+        for attempt in range(self.retries + 1):
+            try:
+                with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    size = 0
+                    with open(path_tmp, "wb") as f:
+                        for chunk in response.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            size += len(chunk)
+                os.replace(path_tmp, path_file)
+                return size
+            except (requests.RequestException, OSError) as e:
+                if attempt == self.retries:
+                    # 最后一次失败时删除临时文件，不在样本目录中留下不完整的图片
+                    try:
+                        os.remove(path_tmp)
+                    except OSError:
+                        pass
+                    raise
+                if self.logger is not None:
+                    self.logger.info("下载失败，{:.1f}秒后重试: {} ({})".format(self.backoff * 2 ** attempt, url, e))
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def download_all(self, tasks, path_manifest=None, save_every=100, on_checkpoint=None, checkpoint_every=1000):
+        """
+        @description  : 并发下载，已记录在下载清单中且文件完整的条目直接跳过
+        ---------
+        @params       :
+                tasks : [(url, 保存路径), ...]
+        path_manifest : 下载清单路径，None时不续传
+           save_every : 每完成save_every个下载保存一次清单
+        on_checkpoint : on_checkpoint(manifest)，每完成checkpoint_every个下载及结束(含失败)时调用，
+                        用于保存与已下载文件一致的附属数据
+        -------
+        @Returns      :
+           downloaded : 本次实际下载的文件数
+        -------
+        """
+        manifest = load_manifest(path_manifest)
+        pending = [(url, path_file) for url, path_file in tasks if not is_done(manifest, url, path_file)]
+        if self.logger is not None and len(pending) < len(tasks):
+            self.logger.info("断点续传，跳过已下载的{}个文件".format(len(tasks) - len(pending)))
+
+        done = 0
+
+        def collect(item):
+            nonlocal done
+            url, path_file, future = item
+            manifest[os.path.basename(path_file)] = {"url": url, "size": future.result()}
+            done += 1
+            if path_manifest is not None and done % save_every == 0:
+                save_manifest(path_manifest, manifest)
+            if on_checkpoint is not None and done % checkpoint_every == 0:
+                on_checkpoint(manifest)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = deque()
+                for url, path_file in pending:
+                    if len(futures) >= 2 * self.concurrency:
+                        collect(futures.popleft())
+                    futures.append((url, path_file, executor.submit(self.download, url, path_file)))
+                while futures:
+                    collect(futures.popleft())
+        finally:
+            # 失败或中断时也保存已完成的部分
+            if path_manifest is not None:
+                save_manifest(path_manifest, manifest)
+            if on_checkpoint is not None:
+                on_checkpoint(manifest)
+        return done
+
+    def close(self):
+        self.session.close()
+
+
+def load_manifest(path_manifest):
+    if path_manifest is None or not os.path.exists(path_manifest):
+        return {}
+    try:
+        with open(path_manifest, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def save_manifest(path_manifest, manifest):
+    write_json(path_manifest, manifest)
+
+
+def is_done(manifest, url, path_file):
+    entry = manifest.get(os.path.basename(path_file))
+    if entry is None or entry["url"] != url:
+        return False
+    try:
+        return os.path.getsize(path_file) == entry["size"]
+    except OSError:
+        return False
+
+
+def benchmark(num_files=300, latency=0.02, size=64 * 1024, concurrency=8):
+    """
+    @description  : 本地模拟文件服务，对比逐个requests.get与Downloader的耗时，并验证断点续传
+    ---------
+    @params       :
+            num_files : 文件数
+              latency : 模拟服务单次请求耗时(秒)
+                 size : 单个文件字节数
+          concurrency : 同时进行的最大下载数
+    -------
+    """
+    import tempfile, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = os.urandom(size)
+    failed = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.endswith("_7.jpg") and self.path not in failed:
+                # 每个文件第一次请求失败，验证重试
+                failed.add(self.path)
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/images/".format(server.server_address[1])
+
+    with tempfile.TemporaryDirectory() as path_dir:
+        tasks = [(url + "sample_{}.jpg".format(i), os.path.join(path_dir, "sample_{}.jpg".format(i))) for i in range(num_files)]
+
+        start = time.perf_counter()
+        for image_url, path_file in tasks:
+            with open(path_file, "wb") as f:
+                f.write(requests.get(image_url).content)
+        serial_time = time.perf_counter() - start
+        for _, path_file in tasks:
+            os.remove(path_file)
+        failed.clear()
+
+        path_manifest = os.path.join(path_dir, ".download.json")
+        downloader = Downloader(concurrency=concurrency, backoff=0.01)
+        start = time.perf_counter()
+        downloader.download_all(tasks[:num_files // 2], path_manifest)
+        downloaded = downloader.download_all(tasks, path_manifest) # 模拟中断后重新请求
+        pooled_time = time.perf_counter() - start
+        downloader.close()
+        assert downloaded == num_files - num_files // 2
+        assert all(os.path.getsize(path_file) == size for _, path_file in tasks)
+    server.shutdown()
+
+    print("{} files, {:.0f}ms latency: requests.get {:.2f}s, Downloader(concurrency={}) {:.2f}s, resumed {} of {}".format(
+        num_files, latency * 1000, serial_time, concurrency, pooled_time, num_files - downloaded, num_files))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,370 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 基于numpy的检测结果mAP计算,全部图片的候选框对一次向量化计算IoU并匹配,按分数排序一次得到P-R曲线
+                      输入与RemoteSensingScore相同的结果json格式 {"results": {图片名: [{"class_name", "bbox", "score"}, ...]}}
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import json, time
+import numpy as np
+
+IOU_THRESHOLD = 0.5
+
+
+def _load(result):
+    # 结果可以是json路径或已加载的字典
+    if isinstance(result, str):
+        with open(result, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    return result["results"]
+
+
+def _flatten(objs_dic, image_index, class_index):
+    """
+    @description  : 将 图片名 -> 目标列表 按image_index的顺序展开为数组，只保留image_index中的图片
+    -------
+    @Returns      :
+               images : (N,) 图片序号
+              classes : (N,) 类别序号，新类别追加到class_index
+                boxes : (N, 4) 坐标
+               scores : (N,) 分数
+    -------
+    """
+    images, classes, boxes, scores = [], [], [], []
+    for image_name, i in image_index.items():
+        for obj in objs_dic.get(image_name, []):
+            images.append(i)
+            classes.append(class_index.setdefault(str(obj["class_name"]), len(class_index)))
+            boxes.append(obj["bbox"])
+            scores.append(obj.get("score", 1))
+    return (np.array(images, dtype=np.int64), np.array(classes, dtype=np.int64),
+            np.array(boxes, dtype=np.float64).reshape(-1, 4), np.array(scores, dtype=np.float64))
+
+
+def iou_pairs(boxes1, boxes2):
+    """
+    @description  : 逐对计算[x1, y1, x2, y2]坐标的IoU，boxes1与boxes2形状相同
+    -------
+    """
+    iw = np.clip(np.minimum(boxes1[:, 2], boxes2[:, 2]) - np.maximum(boxes1[:, 0], boxes2[:, 0]), 0, None)
+    ih = np.clip(np.minimum(boxes1[:, 3], boxes2[:, 3]) - np.maximum(boxes1[:, 1], boxes2[:, 1]), 0, None)
+    inter = iw * ih
+    union = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1]) + (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1]) - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def match_detections(result, label, iou_threshold=IOU_THRESHOLD):
+    """
+    @description  : VOC贪心匹配：同一图片同一类别内按分数从高到低，每个预测框取IoU最大的真值框，
+                    IoU达到阈值且该真值框未被更高分的预测框匹配时为TP，否则为FP。全部图片一次向量化完成
+    ---------
+    @params       :
+               result : 检测结果json路径或字典
+                label : 真值json路径或字典
+        iou_threshold : 匹配IoU阈值
+    -------
+    @Returns      :
+              matches : 字典，images/classes/scores/tp为每个预测框的图片序号、类别序号、分数、是否TP，
+                        npos为(图片数, 类别数)的真值框数，image_names/class_names为序号对应的名称
+    -------
+    """
+    preds = _load(result)
+    gts = _load(label)
+    image_index = {name: i for i, name in enumerate(gts)}
+    class_index = {}
+    gt_images, gt_classes, gt_boxes, _ = _flatten(gts, image_index, class_index)
+    num_gt_classes = len(class_index)
+    images, classes, boxes, scores = _flatten(preds, image_index, class_index)
+    num_classes = len(class_index)
+
+    # 预测框按(图片, 类别, 分数从高到低)排序，真值框按(图片, 类别)排序
+    order = np.lexsort((-scores, classes, images))
+    group = images[order] * num_classes + classes[order]
+    gt_order = np.argsort(gt_images * num_classes + gt_classes, kind="stable")
+    gt_group = (gt_images * num_classes + gt_classes)[gt_order]
+    start = np.searchsorted(gt_group, group, side="left")
+    counts = np.searchsorted(gt_group, group, side="right") - start
+
+    # 每个预测框与同组全部真值框组成候选对，一次计算IoU
+    pair_pred = np.repeat(np.arange(len(order)), counts)
+    offsets = np.arange(len(pair_pred)) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_gt = gt_order[np.repeat(start, counts) + offsets]
+    ious = iou_pairs(boxes[order][pair_pred], gt_boxes[pair_gt])
+
+    # 每个预测框取IoU最大(并列取靠前)的真值框
+    best_pair = np.lexsort((-ious, pair_pred))
+    first = np.cumsum(counts) - counts
+    has_gt = counts > 0
+    best_pair = best_pair[first[has_gt]]
+    cand = np.nonzero(has_gt)[0][ious[best_pair] >= iou_threshold]
+    cand_gt = pair_gt[best_pair][ious[best_pair] >= iou_threshold]
+    # 同一真值框只有分数最高(排序靠前)的预测框为TP
+    _, first_hit = np.unique(cand_gt, return_index=True)
+    tp_sorted = np.zeros(len(order), dtype=bool)
+    tp_sorted[cand[first_hit]] = True
+    tp = np.empty(len(order), dtype=bool)
+    tp[order] = tp_sorted
+
+    npos = np.zeros((len(image_index), num_gt_classes), dtype=np.int64)
+    np.add.at(npos, (gt_images, gt_classes), 1)
+    return {"images": images, "classes": classes, "scores": scores, "tp": tp, "npos": npos,
+            "image_names": list(image_index), "class_names": list(class_index)}
+
+
+def average_precision(scores, tp, npos):
+    """
+    @description  : VOC全点插值AP
+    ---------
+    @params       :
+               scores : 该类别全部预测框的分数，并列时按输入顺序
+                   tp : 与scores对应的TP标记
+                 npos : 该类别真值框数
+    -------
+    """
+    if npos == 0:
+        return 0.0
+    order = np.argsort(-scores, kind="stable")
+    tp = tp[order].astype(np.float64)
+    ctp = np.cumsum(tp)
+    cfp = np.cumsum(1 - tp)
+    rec = ctp / npos
+    prec = ctp / np.maximum(ctp + cfp, np.finfo(np.float64).eps)
+    mrec = np.concatenate(([0.0], rec, [1.0]))
+    mpre = np.concatenate(([0.0], prec, [0.0]))
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+    i = np.nonzero(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1]))
+
+
+def mean_ap(matches):
+    """
+    @description  : 由匹配结果计算mAP，类别为真值中出现的类别
+    -------
+    """
+    npos = matches["npos"].sum(axis=0)
+    aps = []
+    for c, n in enumerate(npos):
+        if n == 0:
+            continue
+        mask = matches["classes"] == c
+        aps.append(average_precision(matches["scores"][mask], matches["tp"][mask], n))
+    return float(np.mean(aps)) if aps else 0.0
+
+
+class MatchTable():
+
+    def __init__(self, result, label, iou_threshold=IOU_THRESHOLD) -> None:
+        """
+        @description  : 每张图片只匹配一次并缓存匹配记录，任意图片子集的mAP只需汇总缓存的记录，
+                        匹配只与图片内的框有关，与抽样的子集无关
+        ---------
+        @params       :
+               result : 检测结果json路径或字典
+                label : 真值json路径或字典(全集)
+        iou_threshold : 匹配IoU阈值
+        -------
+        """
+        matches = match_detections(result, label, iou_threshold)
+        self.image_names = matches["image_names"]
+        self.image_index = {name: i for i, name in enumerate(self.image_names)}
+        self.npos = matches["npos"]
+        # 预测框按(类别, 分数从高到低)排好序，子集计算时不再排序
+        order = np.lexsort((-matches["scores"], matches["classes"]))
+        self.images = matches["images"][order]
+        self.tp = matches["tp"][order].astype(np.float64)
+        classes = matches["classes"][order]
+        num_classes = self.npos.shape[1]
+        self.bounds = np.searchsorted(classes, np.arange(num_classes + 1))
+
+    def subset_mask(self, image_names):
+        mask = np.zeros(len(self.image_names), dtype=bool)
+        mask[[self.image_index[name] for name in image_names]] = True
+        return mask
+
+    def mAP(self, image_names=None, mask=None):
+        """
+        @description  : 图片子集的mAP，与用该子集的真值重新计算的结果相同
+        ---------
+        @params       :
+          image_names : 子集图片名，None为全集
+                 mask : 或直接给出(图片数,)的布尔数组
+        -------
+        """
+        if mask is None:
+            mask = np.ones(len(self.image_names), dtype=bool) if image_names is None else self.subset_mask(image_names)
+        npos = self.npos[mask].sum(axis=0)
+        keep = mask[self.images]
+        aps = []
+        for c, n in enumerate(npos):
+            if n == 0:
+                continue
+            lo, hi = self.bounds[c], self.bounds[c + 1]
+            tp = self.tp[lo:hi][keep[lo:hi]]
+            ctp = np.cumsum(tp)
+            cfp = np.arange(1, len(tp) + 1) - ctp
+            rec = ctp / n
+            prec = ctp / np.maximum(ctp + cfp, np.finfo(np.float64).eps)
+            mrec = np.concatenate(([0.0], rec, [1.0]))
+            mpre = np.concatenate(([0.0], prec, [0.0]))
+            mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+            i = np.nonzero(mrec[1:] != mrec[:-1])[0]
+            aps.append(float(np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])))
+        return float(np.mean(aps)) if aps else 0.0
+
+    def bootstrap(self, rounds, fraction=0.5, rng=None):
+        """
+        @description  : 每轮不放回地抽取fraction比例的图片计算mAP
+        ---------
+        @params       :
+               rounds : 抽样轮数
+             fraction : 每轮抽取的图片比例
+                  rng : random.Random，默认使用random模块
+        -------
+        @Returns      :
+                 maps : 每轮的mAP
+        -------
+        """
+        import random
+        rng = rng or random
+        k = int(fraction * len(self.image_names))
+        return [self.mAP(rng.sample(self.image_names, k)) for _ in range(rounds)]
+
+
+def mean_average_precision(result, label, iou_threshold=IOU_THRESHOLD):
+    """
+    @description  : 计算检测结果相对真值的mAP，只统计真值中的图片
+    ---------
+    @params       :
+               result : 检测结果json路径或字典
+                label : 真值json路径或字典
+        iou_threshold : 匹配IoU阈值
+    -------
+    @Returns      :
+                  mAP : 各类别AP的平均
+    -------
+    """
+    return mean_ap(match_detections(result, label, iou_threshold))
+
+
+def compare_with_legacy(path_result, path_label, iou_threshold=IOU_THRESHOLD):
+    """
+    @description  : 与RemoteSensingScore对比同一结果的mAP，切换scoring.engine前用于核对
+    -------
+    @Returns      :
+               legacy : RemoteSensingScore的mAP
+                 fast : 本模块的mAP
+    -------
+    """
+    from src.utils.baseScore import RemoteSensingScore
+
+    legacy = float(RemoteSensingScore(path_result, path_label).mAP())
+    fast = mean_average_precision(path_result, path_label, iou_threshold)
+    return legacy, fast
+
+
+def _mean_average_precision_python(result, label, iou_threshold=IOU_THRESHOLD):
+    # 逐框计算的参考实现，仅用于核对与对比
+    preds = _load(result)
+    gts = _load(label)
+    classes = {str(o["class_name"]) for objs in gts.values() for o in objs}
+    aps = []
+    for c in sorted(classes):
+        dets = [(float(o.get("score", 1)), name, o["bbox"]) for name in gts for o in preds.get(name, []) if str(o["class_name"]) == c]
+        dets.sort(key=lambda d: -d[0])
+        gt_c = {name: [o["bbox"] for o in objs if str(o["class_name"]) == c] for name, objs in gts.items()}
+        used = {name: [False] * len(v) for name, v in gt_c.items()}
+        npos = sum(len(v) for v in gt_c.values())
+        tp, fp = [], []
+        for _, name, b in dets:
+            best, best_iou = -1, 0.0
+            for j, g in enumerate(gt_c[name]):
+                iw = min(b[2], g[2]) - max(b[0], g[0])
+                ih = min(b[3], g[3]) - max(b[1], g[1])
+                inter = max(iw, 0) * max(ih, 0)
+                union = (b[2] - b[0]) * (b[3] - b[1]) + (g[2] - g[0]) * (g[3] - g[1]) - inter
+                iou = inter / union if union > 0 else 0.0
+                if iou > best_iou:
+                    best, best_iou = j, iou
+            hit = best >= 0 and best_iou >= iou_threshold and not used[name][best]
+            if hit:
+                used[name][best] = True
+            tp.append(1.0 if hit else 0.0)
+            fp.append(0.0 if hit else 1.0)
+        rec, prec, ctp, cfp = [], [], 0.0, 0.0
+        for t, f in zip(tp, fp):
+            ctp += t
+            cfp += f
+            rec.append(ctp / npos)
+            prec.append(ctp / max(ctp + cfp, np.finfo(np.float64).eps))
+        mrec = [0.0] + rec + [1.0]
+        mpre = [0.0] + prec + [0.0]
+        for i in range(len(mpre) - 2, -1, -1):
+            mpre[i] = max(mpre[i], mpre[i + 1])
+        aps.append(sum((mrec[i + 1] - mrec[i]) * mpre[i + 1] for i in range(len(mrec) - 1) if mrec[i + 1] != mrec[i]))
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def _synthetic(num_images, num_classes, seed):
+    rng = np.random.default_rng(seed)
+    gt, pred = {}, {}
+    for i in range(num_images):
+        name = "sample_{}.jpg".format(i)
+        gt[name], pred[name] = [], []
+        for _ in range(rng.integers(1, 10)):
+            x, y = rng.integers(0, 900, 2)
+            w, h = rng.integers(10, 120, 2)
+            c = "class_{}".format(rng.integers(num_classes))
+            gt[name].append({"class_name": c, "bbox": [int(x), int(y), int(x + w), int(y + h)], "score": 1})
+            if rng.random() < 0.8:
+                dx, dy = rng.integers(-15, 16, 2)
+                pred[name].append({"class_name": c if rng.random() < 0.9 else "class_0",
+                                   "bbox": [int(x + dx), int(y + dy), int(x + w + dx), int(y + h + dy)],
+                                   "score": float(rng.random())})
+        for _ in range(rng.integers(0, 3)):
+            x, y = rng.integers(0, 900, 2)
+            pred[name].append({"class_name": "class_{}".format(rng.integers(num_classes)),
+                               "bbox": [int(x), int(y), int(x + 50), int(y + 50)], "score": float(rng.random())})
+    return {"results": pred}, {"results": gt}
+
+
+def benchmark(num_images=2000, num_classes=10, seed=0, bootstrap_rounds=200):
+    """
+    @description  : 与逐框计算的参考实现对比速度与结果
+    ---------
+    @params       :
+           num_images : 图片数
+          num_classes : 类别数
+     bootstrap_rounds : 自助抽样轮数
+    -------
+    """
+    pred, gt = _synthetic(num_images, num_classes, seed)
+
+    start = time.perf_counter()
+    ref = _mean_average_precision_python(pred, gt)
+    ref_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = mean_average_precision(pred, gt)
+    fast_time = time.perf_counter() - start
+
+    print("{} images, {} classes: python {:.3f}s, fast_score {:.3f}s, speedup {:.1f}x, mAP {:.6f} / {:.6f}".format(
+        num_images, num_classes, ref_time, fast_time, ref_time / fast_time, ref, fast))
+
+    # 自助抽样：每轮重新计算 vs 匹配一次后汇总
+    import random
+    keys = [random.Random(k).sample(list(gt["results"]), num_images // 2) for k in range(bootstrap_rounds)]
+    start = time.perf_counter()
+    rescored = [mean_average_precision(pred, {"results": {name: gt["results"][name] for name in key}}) for key in keys]
+    rescore_time = time.perf_counter() - start
+    start = time.perf_counter()
+    table = MatchTable(pred, gt)
+    cached = [table.mAP(key) for key in keys]
+    table_time = time.perf_counter() - start
+    assert np.allclose(rescored, cached, rtol=0, atol=1e-12)
+    print("{} bootstrap rounds: rescore {:.3f}s, MatchTable {:.3f}s".format(bootstrap_rounds, rescore_time, table_time))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,166 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 基于盒式滤波的快速SSIM计算,一次调用计算一张原图与多张噪声图的SSIM分数
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import time
+import cv2
+import numpy as np
+
+K1 = 0.01
+K2 = 0.03
+MAX_CHANNELS = 512 # cv2.boxFilter支持的最大通道数
+BYTES_PER_PIXEL = 8 * 12 # 每张噪声图每个像素同时存在的float64中间数组约12个
+
+
+def _box(x, win_size):
+    """
+    @description  : 均值滤波，只保留不受边界填充影响的有效区域，与skimage裁剪pad后的区域一致
+    ---------
+    @x            : (H, W) 或 (H, W, N) 的float64数组
+    -------
+    @Returns      : (H-win+1, W-win+1[, N]) 的局部均值
+    -------
+    """
+    pad = (win_size - 1) // 2
+    ret = cv2.boxFilter(x, cv2.CV_64F, (win_size, win_size), normalize=True, borderType=cv2.BORDER_REFLECT)
+    return ret.reshape(x.shape)[pad:x.shape[0] - pad, pad:x.shape[1] - pad]
+
+
+def _data_range(image, data_range):
+    if data_range is not None:
+        return float(data_range)
+    if np.issubdtype(image.dtype, np.integer):
+        info = np.iinfo(image.dtype)
+        return float(info.max) - float(info.min)
+    raise ValueError("data_range must be given for floating point images")
+
+
+class SsimReference():
+
+    def __init__(self, image, win_size=7, data_range=None) -> None:
+        """
+        @description  : 原图的局部统计量，计算一次后与所有噪声图复用
+        ---------
+        @params       :
+                image : 原始灰度图
+             win_size : 滑动窗口大小，必须为奇数
+           data_range : 像素取值范围，默认由数据类型推断（uint8为255）
+        -------
+        """
+        if image.ndim != 2:
+            raise ValueError("SSIM expects a single-channel (H, W) image, got shape " + str(image.shape))
+        if win_size % 2 != 1 or win_size > min(image.shape):
+            raise ValueError("win_size must be odd and not larger than the image")
+        self.shape = image.shape
+        self.win_size = win_size
+        self.data_range = _data_range(image, data_range)
+        self.cov_norm = win_size * win_size / (win_size * win_size - 1.0)
+
+        self.image = image.astype(np.float64)
+        self.ux = _box(self.image, win_size)
+        self.ux2 = self.ux * self.ux
+        self.vx = self.cov_norm * (_box(self.image * self.image, win_size) - self.ux2)
+
+
+def ssim_batch(reference, noised, win_size=7, data_range=None, max_batch=8, max_bytes=512 * 1024 ** 2):
+    """
+    @description  : 计算一张原图与N张噪声图的平均SSIM，结果与skimage.metrics.structural_similarity一致
+    ---------
+    @params       :
+            reference : 原始灰度图或SsimReference
+               noised : N张噪声灰度图，(N, H, W)数组或列表
+             win_size : 滑动窗口大小
+           data_range : 像素取值范围
+            max_batch : 每次向量化计算的最大图片数
+            max_bytes : 每次向量化计算的中间数组内存上限，大图时减少每次计算的图片数，至少一张
+    -------
+    @Returns      :
+               scores : (N,) 的SSIM分数
+    -------
+    """
+    if not isinstance(reference, SsimReference):
+        reference = SsimReference(reference, win_size, data_range)
+    C1 = (K1 * reference.data_range) ** 2
+    C2 = (K2 * reference.data_range) ** 2
+    ux = reference.ux[..., None]
+    ux2 = reference.ux2[..., None]
+    vx = reference.vx[..., None]
+    x = reference.image[..., None]
+
+    scores = np.empty(len(noised), dtype=np.float64)
+    step = max(1, min(int(max_batch), MAX_CHANNELS, int(max_bytes) // (reference.image.size * BYTES_PER_PIXEL)))
+    for i in range(0, len(noised), step):
+        chunk = noised[i:i + step]
+        for img in chunk:
+            if img.shape != reference.shape:
+                raise ValueError("Input images must have the same dimensions.")
+        # 将多张噪声图堆叠为多通道，一次滤波完成
+        y = np.stack(chunk, axis=-1).astype(np.float64)
+        uy = _box(y, reference.win_size)
+        uy2 = uy * uy
+        vy = _box(y * y, reference.win_size)
+        vy -= uy2
+        vy *= reference.cov_norm
+        vxy = _box(x * y, reference.win_size)
+        vxy -= ux * uy
+        vxy *= reference.cov_norm
+        del y
+
+        num = 2 * ux * uy
+        num += C1
+        vxy *= 2
+        vxy += C2
+        num *= vxy
+        den = ux2 + uy2
+        den += C1
+        vy += vx
+        vy += C2
+        den *= vy
+        num /= den
+        scores[i:i + len(chunk)] = num.mean(axis=(0, 1), dtype=np.float64)
+    return scores
+
+
+def structural_similarity(im1, im2, win_size=7, data_range=None):
+    """
+    @description  : 单对图片的SSIM，可替换skimage.metrics.structural_similarity的默认用法
+    -------
+    """
+    return float(ssim_batch(im1, [im2], win_size=win_size, data_range=data_range)[0])
+
+
+def benchmark(sizes=(1024, 4096), num_noised=4, seed=0):
+    """
+    @description  : 与skimage对比计算速度与精度
+    ---------
+    @params       :
+                sizes : 测试图片边长
+           num_noised : 每张原图对应的噪声图数
+    -------
+    """
+    from skimage.metrics import structural_similarity as sk_ssim
+
+    rng = np.random.default_rng(seed)
+    for size in sizes:
+        image = cv2.GaussianBlur(rng.integers(0, 256, (size, size), dtype=np.uint8), (0, 0), 3)
+        noised = [np.clip(image.astype(np.int16) + rng.integers(-8 * (k + 1), 8 * (k + 1), image.shape), 0, 255).astype(np.uint8)
+                  for k in range(num_noised)]
+
+        start = time.perf_counter()
+        sk_scores = np.array([sk_ssim(image, img) for img in noised])
+        sk_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = ssim_batch(image, noised)
+        fast_time = time.perf_counter() - start
+
+        print("{0}x{0}, {1} noised: skimage {2:.3f}s, fast_ssim {3:.3f}s, speedup {4:.1f}x, max diff {5:.2e}".format(
+            size, num_noised, sk_time, fast_time, sk_time / fast_time, np.abs(sk_scores - scores).max()))
+
+
+if __name__ == "__main__":
+    benchmark()
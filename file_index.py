@@ -0,0 +1,104 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 任务文件索引,记录样本、噪声目录中排好序的文件名、大小和修改时间,持久化到任务目录,按序号取图片不再listdir+sorted
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, threading
+from src.app.atomic_io import write_json
+
+
+class FileIndex():
+
+    def __init__(self, path_task) -> None:
+        """
+        @description  : 每个任务一个索引文件<path_task>/.file_index.json，目录修改时间变化(增删文件)时重建该目录的索引
+        ---------
+        @path_task    : 任务目录
+        -------
+        """
+        self.path_task = path_task
+        self.path_index = os.path.join(path_task, ".file_index.json")
+        self.lock = threading.Lock()
+        self.dirs = {}
+        if os.path.exists(self.path_index):
+            try:
+                with open(self.path_index, "r") as f:
+                    self.dirs = json.load(f)
+            except ValueError:
+                self.dirs = {}
+
+    def _key(self, path_dir):
+        return os.path.relpath(path_dir, self.path_task)
+
+    def _save(self):
+        write_json(self.path_index, self.dirs)
+
+    def refresh(self, path_dir):
+        """
+        @description  : 重新扫描目录并写入索引，写入文件后调用
+        -------
+        """
+        return self.refresh_many([path_dir])[0]
+
+    def refresh_many(self, path_dirs):
+        """
+        @description  : 重新扫描多个目录，索引文件只保存一次
+        -------
+        @Returns      :
+              records : 与path_dirs对应的目录索引
+        -------
+        """
+        records = [self._scan(path_dir) for path_dir in path_dirs]
+        with self.lock:
+            for path_dir, record in zip(path_dirs, records):
+                self.dirs[self._key(path_dir)] = record
+            self._save()
+        return records
+
+    def _scan(self, path_dir):
+        mtime = os.stat(path_dir).st_mtime_ns
+        files = []
+        with os.scandir(path_dir) as it:
+            for entry in it:
+                # 跳过临时文件和未下载完成的文件
+                if entry.name.startswith(".") or entry.name.endswith(".part") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        files.sort()
+        record = {"mtime": mtime,
+                  "names": [name for name, _, _ in files],
+                  "sizes": [size for _, size, _ in files],
+                  "mtimes": [mtime_ for _, _, mtime_ in files]}
+        return record
+
+    def _record(self, path_dir):
+        # 只stat目录本身，未变化时直接使用索引
+        record = self.dirs.get(self._key(path_dir))
+        if record is None or record["mtime"] != os.stat(path_dir).st_mtime_ns:
+            record = self.refresh(path_dir)
+        return record
+
+    def names(self, path_dir):
+        """
+        @description  : 目录中排好序的文件名，不含隐藏文件、临时文件和子目录
+        -------
+        """
+        return self._record(path_dir)["names"]
+
+    def count(self, path_dir):
+        return len(self._record(path_dir)["names"])
+
+    def name(self, path_dir, index):
+        return self._record(path_dir)["names"][index]
+
+    def stat(self, path_dir, index):
+        """
+        @description  : 序号对应的文件名、大小与修改时间
+        -------
+        """
+        record = self._record(path_dir)
+        return record["names"][index], record["sizes"][index], record["mtimes"][index]
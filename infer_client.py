@@ -0,0 +1,254 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 黑盒模型推理客户端,连接池复用长连接,并发发送推理请求
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, time, base64, mimetypes, threading, requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+
+class DetectError(Exception):
+
+    def __init__(self, message, data=None) -> None:
+        """
+        @description  : 检测接口返回错误码
+        ---------
+        @params       :
+              message : 接口返回的msg
+                 data : 接口返回的data
+        -------
+        """
+        super().__init__(message)
+        self.message = message
+        self.data = data if data is not None else {}
+
+
+def parse_detections(data):
+    """
+    @description  : 将检测接口返回的[[x1, y1, x2, y2, class, score], ...]转换为结果json格式
+    -------
+    """
+    img_obj = []
+    for tar in data:
+        bbox_info = {}
+        bbox_info["class_name"] = str(tar[4])
+        bbox_info["bbox"] = [int(tar[0]), int(tar[1]), int(tar[2]), int(tar[3])]
+        bbox_info["score"] = float(tar[5])
+        img_obj.append(bbox_info)
+    return img_obj
+
+
+BATCH_MODES = ("json", "multipart")
+
+
+class DetectClient():
+
+    def __init__(self, url, encode, concurrency=8, timeout=60, batch_size=1, batch_mode="json", max_batch_failures=3, logger=None) -> None:
+        """
+        @description  : 检测接口客户端，keep-alive会话，最多concurrency个请求同时在途
+        ---------
+        @params       :
+                  url : 检测接口地址
+               encode : 图片路径 -> base64字符串
+          concurrency : 同时在途的最大请求数
+              timeout : 单次请求超时时间(秒)
+           batch_size : 每个请求发送的图片数，1为原单张协议
+           batch_mode : 批量协议，json为dataBase64数组，multipart为原始图片字节
+   max_batch_failures : 批量请求连续超时或连接失败max_batch_failures次后改用单张协议
+               logger : 日志
+        -------
+        """
+        if batch_mode not in BATCH_MODES:
+            raise ValueError("Unknown batch mode: " + str(batch_mode))
+        self.url = url
+        self.encode = encode
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.batch_size = max(1, int(batch_size))
+        self.batch_mode = batch_mode
+        self.max_batch_failures = max(1, int(max_batch_failures))
+        self.batch_failures = 0
+        self.lock = threading.Lock()
+        self.logger = logger
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.headers = {'Content-Type': 'application/json'}
+
+    def detect(self, image_path):
+        """
+        @description  : 单张图片推理
+        -------
+        @Returns      :
+              img_obj : 该图片的检测结果列表
+        -------
+        """
+        data = {"dataBase64": self.encode(image_path)}
+        response = self.session.post(self.url, headers=self.headers, data=json.dumps(data), timeout=self.timeout)
+        json_data = json.loads(response.text)
+        code = int(json_data["code"])
+        if code != 0:
+            raise DetectError(json_data["msg"], json_data["data"])
+        # [[61, 45, 200, 211, "class_2", 0.8787]]
+        return parse_detections(json_data["data"][0])
+
+    def detect_batch(self, image_paths):
+        """
+        @description  : 一个请求推理多张图片，发送原始图片字节，不重新编码。接口拒绝批量请求(4xx、错误码或结果数不符)，
+                        或批量请求5xx而本批逐张推理成功(单张检测服务收到数组时通常返回500)时，此后改用单张协议；
+                        超时、连接错误只将本批改为逐张推理，连续max_batch_failures次后才放弃批量
+        -------
+        @Returns      :
+              img_objs : 与image_paths对应的检测结果列表
+        -------
+        """
+        if self.batch_size <= 1 or len(image_paths) == 1:
+            return [self.detect(image_path) for image_path in image_paths]
+
+        raws = []
+        for image_path in image_paths:
+            with open(image_path, "rb") as f:
+                raws.append(f.read())
+        try:
+            if self.batch_mode == "multipart":
+                files = [("images", (os.path.basename(path), raw, mimetypes.guess_type(path)[0] or "application/octet-stream"))
+                         for path, raw in zip(image_paths, raws)]
+                response = self.session.post(self.url, files=files, timeout=self.timeout)
+            else:
+                data = {"dataBase64": [base64.b64encode(raw).decode() for raw in raws]}
+                response = self.session.post(self.url, headers=self.headers, data=json.dumps(data), timeout=self.timeout)
+        except requests.RequestException as e:
+            if self.logger is not None:
+                self.logger.info("批量推理请求失败，本批改为单张推理: " + str(e))
+            with self.lock:
+                self.batch_failures += 1
+                if self.batch_failures >= self.max_batch_failures:
+                    self._disable_batch("批量推理请求连续失败" + str(self.batch_failures) + "次")
+            return [self.detect(image_path) for image_path in image_paths]
+        if response.status_code >= 500:
+            if self.logger is not None:
+                self.logger.info("批量推理接口返回" + str(response.status_code) + "，本批改为单张推理")
+            # 逐张推理失败时异常直接抛出，说明服务本身异常，不放弃批量
+            img_objs = [self.detect(image_path) for image_path in image_paths]
+            with self.lock:
+                self._disable_batch("批量推理接口返回" + str(response.status_code) + "而单张推理成功")
+            return img_objs
+
+        try:
+            json_data = json.loads(response.text)
+            supported = response.ok and int(json_data["code"]) == 0 and len(json_data["data"]) == len(image_paths)
+        except (ValueError, KeyError, TypeError):
+            supported = False
+        if not supported:
+            with self.lock:
+                self._disable_batch("检测接口拒绝批量请求")
+            return [self.detect(image_path) for image_path in image_paths]
+        with self.lock:
+            self.batch_failures = 0
+        return [parse_detections(tars) for tars in json_data["data"]]
+
+    def _disable_batch(self, reason):
+        # 检测接口只支持单张图片，此后该客户端改用单张协议，调用方持有self.lock
+        if self.batch_size > 1 and self.logger is not None:
+            self.logger.info(reason + "，改为单张推理: " + self.url)
+        self.batch_size = 1
+
+    def detect_all(self, data_path, image_names):
+        """
+        @description  : 并发推理文件夹内的图片，结果按image_names顺序组装
+        -------
+        @Returns      :
+              results : 图片名 -> 检测结果列表
+        -------
+        """
+        ret = {}
+        batches = [image_names[i:i + self.batch_size] for i in range(0, len(image_names), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = deque()
+            for batch in batches:
+                if len(futures) >= 2 * self.concurrency:
+                    names, future = futures.popleft()
+                    ret.update(zip(names, future.result()))
+                futures.append((batch, executor.submit(self.detect_batch, [os.path.join(data_path, name) for name in batch])))
+            while futures:
+                names, future = futures.popleft()
+                ret.update(zip(names, future.result()))
+        return {image_name: ret[image_name] for image_name in image_names}
+
+    def close(self):
+        self.session.close()
+
+
+def benchmark(num_images=200, latency=0.02, concurrency=8, batch_size=8):
+    """
+    @description  : 本地模拟检测服务，对比逐张requests.post与DetectClient(单张/json批量)的耗时
+    ---------
+    @params       :
+           num_images : 图片数
+              latency : 模拟服务单次请求耗时(秒)
+          concurrency : 同时在途的最大请求数
+           batch_size : 批量协议每个请求的图片数
+    -------
+    """
+    import base64, tempfile, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["dataBase64"]
+            num = len(data) if isinstance(data, list) else 1
+            time.sleep(latency)
+            body = json.dumps({"code": 0, "msg": "success", "data": [[[1, 2, 30, 40, "class_0", 0.9]]] * num}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/detect/stand-in".format(server.server_address[1])
+
+    with tempfile.TemporaryDirectory() as data_path:
+        image_names = []
+        for i in range(num_images):
+            image_names.append("sample_{}.jpg".format(i))
+            with open(os.path.join(data_path, image_names[-1]), "wb") as f:
+                f.write(os.urandom(32 * 1024))
+        encode = lambda path: base64.b64encode(open(path, "rb").read()).decode()
+
+        start = time.perf_counter()
+        for image_name in image_names:
+            data = {"dataBase64": encode(os.path.join(data_path, image_name))}
+            response = requests.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(data))
+            json.loads(response.text)
+        serial_time = time.perf_counter() - start
+
+        times = []
+        for size in (1, batch_size):
+            client = DetectClient(url, encode, concurrency=concurrency, batch_size=size)
+            start = time.perf_counter()
+            results = client.detect_all(data_path, image_names)
+            times.append(time.perf_counter() - start)
+            client.close()
+            assert list(results) == image_names
+    server.shutdown()
+
+    print("{} images, {:.0f}ms latency: requests.post {:.2f}s, DetectClient(concurrency={}) {:.2f}s, batch_size={} {:.2f}s".format(
+        num_images, latency * 1000, serial_time, concurrency, times[0], batch_size, times[1]))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,172 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 常驻推理进程(本地模型/白盒容器内)的管理端,每个任务启动一次,模型权重只加载一次
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, sys, json, time, socket, threading, subprocess
+
+PATH_ENTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_worker.py")
+
+
+class WorkerExited(RuntimeError):
+    pass
+
+
+class LocalModelWorker():
+
+    def __init__(self, path_model, python="python", logger=None) -> None:
+        """
+        @description  : 在模型目录中启动model_worker.py，通过管道收发推理请求
+        ---------
+        @params       :
+           path_model : 模型目录，需包含test.py
+               python : 模型环境的python解释器
+               logger : 日志
+        -------
+        """
+        self.path_model = os.path.abspath(path_model)
+        self.python = python
+        self.logger = logger
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.alive():
+            return
+        self._log("启动本地模型常驻推理进程: " + self.path_model)
+        self.process = subprocess.Popen([self.python, PATH_ENTRY], cwd=self.path_model,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=sys.stderr,
+                                        text=True, bufsize=1)
+        ready = self._read()
+        if not ready["success"]:
+            raise RuntimeError(ready["message"])
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def infer(self, data_path):
+        """
+        @description  : 推理一个文件夹，进程在请求过程中退出时重启并重试一次
+        -------
+        @Returns      :
+          result_json : 推理结果
+        -------
+        """
+        with self.lock:
+            for attempt in range(2):
+                if not self.alive():
+                    self.start()
+                try:
+                    self.process.stdin.write(json.dumps({"data_path": os.path.abspath(data_path)}) + "\n")
+                    self.process.stdin.flush()
+                    response = self._read()
+                    break
+                except (OSError, WorkerExited):
+                    self.close()
+                    if attempt == 1:
+                        raise
+                    self._log("本地模型常驻推理进程已退出，重启后重试")
+        if not response["success"]:
+            raise RuntimeError(response["message"])
+        return response["result"]
+
+    def _read(self):
+        line = self.process.stdout.readline()
+        if not line:
+            self.close()
+            raise WorkerExited("本地模型常驻推理进程已退出")
+        return json.loads(line)
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def _log(self, msg):
+        if self.logger is not None:
+            self.logger.info(msg)
+
+
+class SocketModelWorker():
+
+    def __init__(self, path_socket, startup_timeout=600, is_running=None, logger=None) -> None:
+        """
+        @description  : 通过挂载目录中的unix socket访问容器内的常驻推理进程(model_worker.py --socket)
+        ---------
+        @params       :
+          path_socket : 宿主机上的socket路径
+      startup_timeout : 等待模型加载完成的最长时间(秒)
+           is_running : 返回常驻推理进程是否仍在运行的函数，进程已退出时立即放弃等待
+               logger : 日志
+        -------
+        """
+        self.path_socket = path_socket
+        self.startup_timeout = startup_timeout
+        self.is_running = is_running
+        self.logger = logger
+        self.conn = None
+        self.reader = None
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.conn is not None:
+            return
+        deadline = time.time() + self.startup_timeout
+        while not os.path.exists(self.path_socket):
+            if time.time() > deadline:
+                raise RuntimeError("等待容器内常驻推理进程超时: " + self.path_socket)
+            if self.is_running is not None and not self.is_running():
+                # 镜像中没有可用的python或model_worker.py启动出错，不再等待
+                raise RuntimeError("容器内常驻推理进程已退出: " + self.path_socket)
+            time.sleep(0.5)
+        self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.conn.connect(self.path_socket)
+        self.reader = self.conn.makefile("r")
+        self.writer = self.conn.makefile("w")
+        if self.logger is not None:
+            self.logger.info("已连接容器内常驻推理进程: " + self.path_socket)
+
+    def infer(self, data_path):
+        """
+        @description  : 推理一个文件夹
+        ---------
+        @data_path    : 容器内的数据路径
+        -------
+        @Returns      :
+          result_json : 推理结果
+        -------
+        """
+        with self.lock:
+            self.connect()
+            try:
+                self.writer.write(json.dumps({"data_path": data_path}) + "\n")
+                self.writer.flush()
+                line = self.reader.readline()
+            except OSError:
+                self.close()
+                raise
+            if not line:
+                self.close()
+                raise RuntimeError("容器内常驻推理进程已退出")
+        response = json.loads(line)
+        if not response["success"]:
+            raise RuntimeError(response["message"])
+        return response["result"]
+
+    def close(self):
+        for f in (self.reader, self.writer, self.conn):
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        self.conn = self.reader = self.writer = None
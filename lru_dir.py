@@ -0,0 +1,140 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 两级目录(<root>/<2位前缀>/<条目>)的磁盘缓存容量控制,统计条目总大小,超过上限时按最近使用时间淘汰
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, threading
+
+
+class LruDir():
+
+    def __init__(self, root, max_bytes, label="缓存", sidecar=None, sidecar_recency=False, logger=None) -> None:
+        """
+        @description  : 以条目文件的修改时间作为最近使用时间，跳过以.开头的临时文件
+        ---------
+        @params       :
+                 root : 条目所在的根目录
+            max_bytes : 容量上限
+                label : 日志中的缓存名
+              sidecar : 附属文件扩展名，附属文件与条目同名，不计为条目，淘汰条目时一起删除
+      sidecar_recency : 以附属文件的修改时间作为最近使用时间，条目被硬链接到其他目录时不修改共享inode的修改时间
+               logger : 日志
+        -------
+        """
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.label = label
+        self.sidecar = sidecar
+        self.sidecar_recency = sidecar is not None and sidecar_recency
+        self.logger = logger
+        self.lock = threading.Lock()
+        self._size = None
+
+    def __getstate__(self):
+        # 传给子进程时不带锁和日志，子进程重新统计大小
+        state = self.__dict__.copy()
+        state["_size"] = None
+        state["logger"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _sidecar_path(self, path_entry):
+        return os.path.splitext(path_entry)[0] + self.sidecar
+
+    def touch(self, path_entry):
+        """
+        @description  : 更新条目的最近使用时间，条目不存在时抛出OSError
+        -------
+        """
+        if not self.sidecar_recency:
+            os.utime(path_entry)
+            return
+        os.stat(path_entry)
+        path_sidecar = self._sidecar_path(path_entry)
+        try:
+            os.utime(path_sidecar)
+        except FileNotFoundError:
+            with open(path_sidecar, "a"):
+                pass
+
+    def add(self, path_entry):
+        """
+        @description  : 新条目写入后调用，超过上限时淘汰
+        -------
+        """
+        with self.lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path_entry)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def trim(self):
+        """
+        @description  : 重新统计大小，超过上限时淘汰
+        -------
+        """
+        with self.lock:
+            self._size = self._scan_size()
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        entries = []
+        if not os.path.exists(self.root):
+            return entries
+        for d in os.listdir(self.root):
+            path_d = os.path.join(self.root, d)
+            if not os.path.isdir(path_d):
+                continue
+            for name in os.listdir(path_d):
+                if name.startswith(".") or (self.sidecar is not None and name.endswith(self.sidecar)):
+                    continue
+                path_entry = os.path.join(path_d, name)
+                try:
+                    stat = os.stat(path_entry)
+                except OSError:
+                    continue
+                mtime = stat.st_mtime
+                if self.sidecar_recency:
+                    try:
+                        mtime = max(mtime, os.stat(self._sidecar_path(path_entry)).st_mtime)
+                    except OSError:
+                        pass
+                entries.append((mtime, stat.st_size, path_entry))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._scan())
+
+    def _evict(self):
+        """
+        @description  : 按最近使用时间淘汰，直至缓存大小降到上限的90%
+        -------
+        """
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = 0.9 * self.max_bytes
+        removed = 0
+        for _, size, path_entry in entries:
+            if total <= target:
+                break
+            paths = [path_entry] if self.sidecar is None else [path_entry, self._sidecar_path(path_entry)]
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self._size = total
+        if self.logger is not None and removed:
+            self.logger.info(self.label + "淘汰" + str(removed) + "个条目")
@@ -0,0 +1,120 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 常驻模型推理进程,在被测模型目录(test.py所在目录)或白盒容器的工作目录中运行,只依赖标准库
+                      协议: 每行一个json请求 {"data_path": ...}，每行一个json响应 {"success": ..., "message": ..., "result": ...}
+                      默认通过stdin/stdout通信；--socket PATH 时监听unix socket，socket文件出现即表示模型已加载
+                      --result PATH 指定test.py写出的结果文件，白盒容器中为/result/result.json
+                      若test.py提供load_model()和infer(model, data_path)，权重只加载一次；
+                      否则在同一进程内重复执行test.py，省去解释器启动和框架导入
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, sys, json, socket, runpy, importlib.util, traceback
+
+
+class ModelRunner():
+
+    def __init__(self, path_model, path_result=None) -> None:
+        """
+        @description  : 加载被测模型
+        ---------
+        @path_model   : 模型目录，需包含test.py
+        @path_result  : test.py写出的结果文件，默认为模型目录下的result/result.json
+        -------
+        """
+        self.path_model = os.path.abspath(path_model)
+        self.path_test = os.path.join(self.path_model, "test.py")
+        self.path_result = path_result or os.path.join(self.path_model, "result", "result.json")
+        sys.path.insert(0, self.path_model)
+        self.module = None
+        self.model = None
+
+        spec = importlib.util.spec_from_file_location("robust_test_module", self.path_test)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module) # test.py的__main__部分不会执行
+        except (Exception, SystemExit) as e:
+            # test.py在模块顶层直接读取命令行参数推理，只能整体重复执行
+            print("test.py can not be imported ({}), re-run it for every request".format(repr(e)), file=sys.stderr)
+            return
+        if hasattr(module, "load_model") and hasattr(module, "infer"):
+            self.module = module
+            self.model = module.load_model()
+
+    def infer(self, data_path):
+        if self.module is not None:
+            return self.module.infer(self.model, data_path)
+        if os.path.exists(self.path_result):
+            os.remove(self.path_result)
+        argv = sys.argv
+        sys.argv = [self.path_test, data_path]
+        try:
+            runpy.run_path(self.path_test, run_name="__main__")
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError("test.py exited with code " + str(e.code))
+        finally:
+            sys.argv = argv
+        with open(self.path_result, "r") as f:
+            return json.load(f)
+
+
+def serve(runner, reader, writer):
+    """
+    @description  : 逐行处理推理请求，直到输入结束
+    -------
+    """
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            result = runner.infer(request["data_path"])
+            response = {"success": True, "message": "success", "result": result}
+        except Exception as e:
+            traceback.print_exc()
+            response = {"success": False, "message": str(e), "result": {}}
+        writer.write(json.dumps(response) + "\n")
+        writer.flush()
+
+
+def serve_socket(runner, path_socket):
+    """
+    @description  : 监听unix socket，依次处理每个连接
+    -------
+    """
+    if os.path.exists(path_socket):
+        os.remove(path_socket)
+    path_tmp = path_socket + ".tmp"
+    if os.path.exists(path_tmp):
+        os.remove(path_tmp)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path_tmp)
+    os.chmod(path_tmp, 0o777)
+    server.listen(1)
+    os.rename(path_tmp, path_socket) # 模型加载完成后才出现socket文件
+    while True:
+        conn, _ = server.accept()
+        with conn, conn.makefile("r") as reader, conn.makefile("w") as writer:
+            serve(runner, reader, writer)
+
+
+def main():
+    # 协议使用原始stdout，模型自身的print(包括C扩展的输出)全部重定向到stderr
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    path_result = sys.argv[sys.argv.index("--result") + 1] if "--result" in sys.argv else None
+    runner = ModelRunner(os.getcwd(), path_result)
+    if "--socket" in sys.argv:
+        serve_socket(runner, sys.argv[sys.argv.index("--socket") + 1])
+        return
+    protocol_out.write(json.dumps({"success": True, "message": "ready", "result": {}}) + "\n")
+    protocol_out.flush()
+    serve(runner, sys.stdin, protocol_out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 扰动样本生成引擎,供app_fun调用
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, cv2, json, random, threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from src.utils.utils import noiseSingleimg_sec
+from src.app.fast_ssim import ssim_batch, SsimReference
+from src.app.perturb_cache import PerturbCache
+from src.app.atomic_io import write_json
+
+
+class DecodedSample():
+
+    def __init__(self, path_image) -> None:
+        """
+        @description  : 原始图片只解码一次，灰度图和ssim统计量按需计算后缓存，供所有噪声类型只读共享
+        ---------
+        @path_image   : 原始图片路径
+        -------
+        """
+        self.name = os.path.basename(path_image)
+        self.image = cv2.imread(path_image)
+        self._gray = None
+        self._ssim_reference = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            self._gray.flags.writeable = False
+        return self._gray
+
+    @property
+    def ssim_reference(self):
+        if self._ssim_reference is None:
+            reference = SsimReference(self.gray)
+            for arr in (reference.image, reference.ux, reference.ux2, reference.vx):
+                arr.flags.writeable = False
+            self._ssim_reference = reference
+        return self._ssim_reference
+
+
+class _NoiseJob():
+
+    def __init__(self, path_basic_data, path_noise_data, interference, skip_dirs, cache, seed, plan) -> None:
+        """
+        @description  : 一次噪声生成任务的参数，随分片传给执行器
+        ---------
+        @params       :
+     path_basic_data  : 原始图片文件夹
+     path_noise_data  : 噪声图片根目录
+        interference  : 噪声强度
+           skip_dirs  : 已存在的历史噪声工况，不再写入
+               cache  : 扰动样本缓存，None表示不使用
+                seed  : 随机种子
+                plan  : 噪声强度名字典，已知时可直接从缓存补全
+        -------
+        """
+        self.path_basic_data = path_basic_data
+        self.path_noise_data = path_noise_data
+        self.interference = interference
+        self.skip_dirs = skip_dirs
+        self.cache = cache
+        self.seed = seed
+        self.plan = plan
+
+
+def _seed_rng(digest, seed):
+    """
+    @description  : 按原图内容和随机种子设置随机数，同一图片的噪声结果可复现
+    -------
+    """
+    value = int(digest[:16], 16) ^ int(seed)
+    random.seed(value)
+    np.random.seed(value % (2 ** 32))
+
+
+# random与np.random的全局状态在线程间共享，设种子与合成噪声必须一起持锁，
+# 否则thread执行器下同一(原图, 噪声强度名, 种子)会得到不同的噪声图并写入缓存
+_RNG_LOCK = threading.Lock()
+
+
+def _synthesize(digest, seed, image, interference):
+    with _RNG_LOCK:
+        _seed_rng(digest, seed)
+        return noiseSingleimg_sec(img=image, interference=interference)
+
+
+def _imwrite(path_image, image):
+    # 先写临时文件再替换，不修改已有文件(可能与缓存共享硬链接)的内容
+    path_tmp = os.path.join(os.path.dirname(path_image), "." + os.path.basename(path_image) + ".tmp" + os.path.splitext(path_image)[1])
+    if not cv2.imwrite(path_tmp, image):
+        raise IOError("Failed to write " + path_image)
+    os.replace(path_tmp, path_image)
+
+
+def _should_write(job, noise_name, need):
+    return noise_name not in job.skip_dirs and (need is None or noise_name in need)
+
+
+def _noise_one(job, image_name, need=None):
+    """
+    @description  : 对单张图片添加噪声，写入各噪声文件夹，并计算每类噪声的ssim分数。缓存全部命中时不解码原图
+    ---------
+    @params       :
+                 job: 噪声生成任务参数
+          image_name: 图片名
+                need: 需要写入的噪声强度名集合，None表示全部
+    -------
+    @Returns      :
+     ssim_score_dic_perimg: 该图片每类噪声的ssim分数
+    -------
+    """
+    path_image = os.path.join(job.path_basic_data, image_name)
+    digest = PerturbCache.digest_file(path_image)
+    if job.cache is not None and job.plan is not None:
+        ret = _from_cache(job, image_name, digest, need)
+        if ret is not None:
+            return ret
+
+    sample = DecodedSample(path_image)
+    noise_imgdic, noise_intensitydic = _synthesize(digest, job.seed, sample.image, job.interference)
+    return _write_noised(job, sample, digest, noise_imgdic, noise_intensitydic, need)
+
+
+def _from_cache(job, image_name, digest, need=None):
+    """
+    @description  : 从扰动样本缓存补全一张图片的所有噪声图和ssim分数，任一条目缺失返回None
+    -------
+    """
+    ssim_score_dic_perimg = {}
+    fetched = set()
+    for key, value in job.plan.items():
+        for k in range(len(value)):
+            if not _should_write(job, value[k], need) or value[k] in fetched:
+                meta = None
+            else:
+                noise_path = os.path.join(job.path_noise_data, value[k])
+                os.makedirs(noise_path, mode=0o777, exist_ok=True)
+                meta = job.cache.fetch(digest, value[k], job.seed, os.path.join(noise_path, image_name))
+                if meta is None:
+                    return None
+                fetched.add(value[k])
+            if key != "allnoise" and k == len(value) - 1:
+                if meta is None:
+                    meta = job.cache.fetch(digest, value[k], job.seed, os.path.join(job.path_noise_data, value[k], image_name))
+                if meta is None or key not in meta.get("ssim", {}):
+                    return None
+                ssim_score_dic_perimg[key] = meta["ssim"][key]
+    return ssim_score_dic_perimg
+
+
+def _write_noised(job, sample, digest, noise_imgdic, noise_intensitydic, need=None):
+    """
+    @description  : 将一张图片的各强度噪声图写入对应噪声文件夹并加入缓存，返回每类噪声的ssim分数
+    -------
+    """
+    written = {}
+    ssim_keys = []
+    ssim_images = []
+    for key, value in noise_intensitydic.items():
+        for k in range(len(value)):
+            if _should_write(job, value[k], need) and value[k] not in written:
+                noise_path = os.path.join(job.path_noise_data, value[k])
+                os.makedirs(noise_path, mode=0o777, exist_ok=True)
+                written[value[k]] = os.path.join(noise_path, sample.name)
+                _imwrite(written[value[k]], noise_imgdic[key][k])
+            if key != "allnoise" and k == len(value) - 1:
+                ssim_keys.append(key)
+                ssim_images.append(cv2.cvtColor(noise_imgdic[key][k], cv2.COLOR_BGR2GRAY))
+    ssim_score_dic_perimg = {}
+    if len(ssim_keys) > 0:
+        # 每类噪声的最高强度图与原图的缓存统计量一次性批量计算ssim
+        scores = ssim_batch(sample.ssim_reference, ssim_images)
+        ssim_score_dic_perimg = {key: float(score) for key, score in zip(ssim_keys, scores)}
+
+    if job.cache is not None:
+        metas = {}
+        for key in ssim_keys:
+            metas.setdefault(noise_intensitydic[key][-1], {})[key] = ssim_score_dic_perimg[key]
+        for noise_name, path_noise_image in written.items():
+            meta = {"ssim": metas[noise_name]} if noise_name in metas else None
+            job.cache.store(digest, noise_name, job.seed, path_noise_image, meta)
+    return ssim_score_dic_perimg
+
+
+def _noise_shard(job, items):
+    """
+    @description  : 执行器入口，处理一组图片
+    ---------
+    @items        : [(图片名, 需要写入的噪声强度名集合)]
+    -------
+    @Returns      :
+        ssim_score_dic: 该组图片的ssim分数，按items顺序
+    -------
+    """
+    ssim_score_dic = {}
+    for image_name, need in items:
+        ssim_score_dic[image_name] = _noise_one(job, image_name, need)
+    return ssim_score_dic
+
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+class NoiseEngine():
+
+    def __init__(self, executor="process", workers=None, chunk_size=16, max_inflight=None, cache=None, seed=0, incremental=True, logger=None) -> None:
+        """
+        @description  : 扰动样本生成引擎，generate_data和pre_conditions共用。图片按分片分发到执行器，各分片自行写入噪声文件夹
+        ---------
+        @params       :
+             executor : 执行器类型，serial/thread/process
+             workers  : 并行数，默认为cpu核数
+           chunk_size : 每个分片的图片数
+         max_inflight : 同时提交的最大分片数，限制内存占用，默认为2倍并行数
+                cache : 扰动样本缓存PerturbCache，None表示不使用
+                 seed : 随机种子
+          incremental : 增量模式，按噪声文件夹清单只生成缺失或过期的(图片, 噪声强度)
+               logger : 日志
+        -------
+        """
+        if executor != "serial" and executor not in EXECUTORS:
+            raise ValueError("Unknown executor: " + str(executor))
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_inflight = max_inflight or 2 * self.workers
+        self.cache = cache
+        self.seed = seed
+        self.incremental = incremental
+        self.logger = logger
+
+    def run(self, path_basic_data, path_noise_data, interference, ssim_score_prev=None, on_chunk=None):
+        """
+        @description  : 对文件夹内所有图片添加噪声，结果与串行执行一致
+        ---------
+        @params       :
+     path_basic_data  : 原始图片文件夹
+     path_noise_data  : 噪声图片根目录
+        interference  : 噪声强度
+     ssim_score_prev  : 已有的ssim分数，增量模式下只更新新生成图片的条目
+            on_chunk  : 每个分片写完后的回调on_chunk(noise_intensitydic, 图片名列表)，按图片列表顺序调用
+        -------
+        @Returns      :
+      ssim_score_dic  : 每张图中每类噪声的ssim分数，按图片列表顺序
+  noise_intensitydic  : 噪声强度名字典
+        -------
+        """
+        # 跳过隐藏文件、原子写的临时文件和未下载完成的.part文件，与FileIndex一致
+        image_list = [name for name in os.listdir(path_basic_data)
+                      if not name.startswith(".") and not name.endswith(".part")
+                      and os.path.isfile(os.path.join(path_basic_data, name))]
+        print("----num of image: " + str(len(image_list)))
+        self._log("num of image: " + str(len(image_list)))
+        if len(image_list) == 0:
+            return {}, {}
+
+        job = _NoiseJob(path_basic_data, path_noise_data, interference, set(), self.cache, self.seed, None)
+        if self.cache is not None:
+            job.plan = self.cache.get_plan(interference)
+        first = None
+        if job.plan is None:
+            # 第一张图片在主进程处理，用于确定噪声强度名
+            path_first = os.path.join(path_basic_data, image_list[0])
+            digest = PerturbCache.digest_file(path_first)
+            first = DecodedSample(path_first)
+            noise_imgdic, job.plan = _synthesize(digest, self.seed, first.image, interference)
+            if self.cache is not None:
+                self.cache.put_plan(interference, job.plan)
+        noise_intensitydic = job.plan
+        print("添加噪声强度：" + str(noise_intensitydic["allnoise"]))
+
+        if self.incremental:
+            manifests, records, pending = self._plan_incremental(job, image_list, ssim_score_prev or {})
+        else:
+            # 不使用缓存时跳过历史噪声工况；使用缓存时从缓存补全，避免写了一半的文件夹被当作完整结果
+            for value in noise_intensitydic.values():
+                for noise_name in value:
+                    if os.path.exists(os.path.join(path_noise_data, noise_name)):
+                        self._log("存在历史噪声工况" + noise_name)
+                        print("存在历史噪声工况" + str(noise_name))
+                        if self.cache is None:
+                            job.skip_dirs.add(noise_name)
+            pending = [(image_name, None) for image_name in image_list]
+
+        ssim_score_new = {}
+        if first is not None:
+            if len(pending) > 0 and pending[0][0] == first.name:
+                self._merge(ssim_score_new, {first.name: _write_noised(job, first, digest, noise_imgdic, noise_intensitydic, pending[0][1])},
+                            noise_intensitydic, on_chunk)
+                pending = pending[1:]
+            del first, noise_imgdic
+
+        shards = (pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size))
+        if self.executor == "serial" or self.workers <= 1:
+            for shard in shards:
+                self._merge(ssim_score_new, _noise_shard(job, shard), noise_intensitydic, on_chunk)
+        else:
+            with EXECUTORS[self.executor](max_workers=self.workers) as executor:
+                # 最多同时提交max_inflight个分片，按提交顺序合并，保证ssim.json与串行执行一致
+                futures = deque()
+                for shard in shards:
+                    if len(futures) >= self.max_inflight:
+                        self._merge(ssim_score_new, futures.popleft().result(), noise_intensitydic, on_chunk)
+                    futures.append(executor.submit(_noise_shard, job, shard))
+                while futures:
+                    self._merge(ssim_score_new, futures.popleft().result(), noise_intensitydic, on_chunk)
+        if self.cache is not None:
+            self.cache.trim()
+
+        if self.incremental:
+            self._save_manifests(path_noise_data, manifests, records, ssim_score_new)
+            ssim_score_prev = ssim_score_prev or {}
+            ssim_score_dic = {name: ssim_score_new[name] if name in ssim_score_new else ssim_score_prev[name] for name in image_list}
+        else:
+            ssim_score_dic = {name: ssim_score_new[name] for name in image_list}
+        return ssim_score_dic, noise_intensitydic
+
+    def _merge(self, ssim_score_new, ssim_score_shard, noise_intensitydic, on_chunk):
+        ssim_score_new.update(ssim_score_shard)
+        if on_chunk is not None:
+            on_chunk(noise_intensitydic, list(ssim_score_shard))
+
+    def _plan_incremental(self, job, image_list, ssim_score_prev):
+        """
+        @description  : 对比噪声文件夹清单，找出缺失或过期(原图已修改、随机种子变化、文件丢失)的(图片, 噪声强度)
+        -------
+        @Returns      :
+            manifests : 每个噪声强度名对应的清单
+              records : 每张原图当前的记录
+              pending : [(图片名, 需要写入的噪声强度名集合)]
+        -------
+        """
+        noise_names = sorted({noise_name for value in job.plan.values() for noise_name in value})
+        families = [key for key in job.plan if key != "allnoise"]
+        records = {}
+        for image_name in image_list:
+            stat = os.stat(os.path.join(job.path_basic_data, image_name))
+            records[image_name] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "seed": job.seed}
+
+        manifests = {}
+        present = {}
+        for noise_name in noise_names:
+            path_dir = os.path.join(job.path_noise_data, noise_name)
+            present[noise_name] = set(os.listdir(path_dir)) if os.path.exists(path_dir) else set()
+            if os.path.exists(self._manifest_path(job.path_noise_data, noise_name)):
+                manifests[noise_name] = self._load_manifest(job.path_noise_data, noise_name)
+            else:
+                manifests[noise_name] = self._bootstrap_manifest(job, noise_name, present[noise_name], records)
+
+        pending = []
+        for image_name in image_list:
+            need = {noise_name for noise_name in noise_names
+                    if image_name not in present[noise_name] or manifests[noise_name].get(image_name) != records[image_name]}
+            ssim_missing = any(key not in ssim_score_prev.get(image_name, {}) for key in families)
+            if need or ssim_missing:
+                pending.append((image_name, need))
+        print("----num of image to generate: " + str(len(pending)))
+        self._log("num of image to generate: " + str(len(pending)))
+        return manifests, records, pending
+
+    def _manifest_path(self, path_noise_data, noise_name):
+        return os.path.join(path_noise_data, ".manifest", noise_name + ".json")
+
+    def _load_manifest(self, path_noise_data, noise_name):
+        path_manifest = self._manifest_path(path_noise_data, noise_name)
+        if not os.path.exists(path_manifest):
+            return {}
+        with open(path_manifest, "r") as f:
+            return json.load(f)
+
+    def _bootstrap_manifest(self, job, noise_name, present, records):
+        """
+        @description  : 没有清单的历史噪声文件夹(增量生成之前的任务)，按已有文件建立清单，
+                        噪声图晚于原图修改的视为有效，避免整个文件夹重新生成而使result/<noise>.json与噪声图不一致
+        -------
+        """
+        manifest = {}
+        path_dir = os.path.join(job.path_noise_data, noise_name)
+        for image_name in present:
+            record = records.get(image_name)
+            if record is not None and os.stat(os.path.join(path_dir, image_name)).st_mtime_ns >= record["mtime"]:
+                manifest[image_name] = record
+        if len(manifest) > 0:
+            self._log("历史噪声工况" + noise_name + "没有清单，按已有的" + str(len(manifest)) + "张图片建立")
+            os.makedirs(os.path.join(job.path_noise_data, ".manifest"), mode=0o777, exist_ok=True)
+            write_json(self._manifest_path(job.path_noise_data, noise_name), manifest)
+        return manifest
+
+    def _save_manifests(self, path_noise_data, manifests, records, generated):
+        # 清单放在噪声文件夹之外，避免被当作噪声图片送去推理
+        os.makedirs(os.path.join(path_noise_data, ".manifest"), mode=0o777, exist_ok=True)
+        for noise_name, manifest in manifests.items():
+            changed = False
+            for image_name in generated:
+                if os.path.exists(os.path.join(path_noise_data, noise_name, image_name)) and manifest.get(image_name) != records[image_name]:
+                    manifest[image_name] = records[image_name]
+                    changed = True
+            if changed:
+                write_json(self._manifest_path(path_noise_data, noise_name), manifest)
+
+    def _log(self, msg):
+        if self.logger is not None:
+            self.logger.info(msg)
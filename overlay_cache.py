@@ -0,0 +1,69 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 推理结果图按需绘制,首次查看时绘制并写入磁盘缓存,按(图片路径、大小、修改时间、检测框)寻址,超过容量按最近使用时间淘汰
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, hashlib, threading
+import cv2
+from src.app.lru_dir import LruDir
+
+
+class OverlayCache():
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, logger=None) -> None:
+        """
+        @description  : 推理结果图缓存，多个任务共享
+        ---------
+        @params       :
+                 root : 缓存根目录
+            max_bytes : 缓存容量上限
+               logger : 日志
+        -------
+        """
+        self.root = root
+        self.logger = logger
+        self.lru = LruDir(root, max_bytes, "推理结果图缓存", logger=logger)
+
+    def _entry(self, path_image, detections):
+        stat = os.stat(path_image)
+        content = json.dumps([os.path.abspath(path_image), stat.st_size, stat.st_mtime_ns, detections], sort_keys=True)
+        key = hashlib.sha256(content.encode()).hexdigest()
+        return os.path.join(self.root, key[:2], key + os.path.splitext(path_image)[1])
+
+    def get(self, path_image, detections, draw):
+        """
+        @description  : 返回绘制好检测框的图片路径，未命中时读取原图绘制后写入缓存
+        ---------
+        @params       :
+           path_image : 噪声图或原图路径
+           detections : 该图片的推理结果
+                 draw : 绘制函数 draw(detections, image) -> image
+        -------
+        @Returns      :
+           path_entry : 缓存中的结果图路径
+        -------
+        """
+        path_entry = self._entry(path_image, detections)
+        try:
+            self.lru.touch(path_entry) # 更新最近使用时间
+            return path_entry
+        except OSError:
+            pass
+
+        image = cv2.imread(path_image)
+        if image is None:
+            raise ValueError("ERROR: can't read image " + path_image)
+        image_result = draw(detections, image)
+        os.makedirs(os.path.dirname(path_entry), exist_ok=True)
+        # 以.开头，容量统计时跳过
+        path_tmp = os.path.join(os.path.dirname(path_entry), ".{}.{}.{}.tmp{}".format(
+            os.path.basename(path_entry), os.getpid(), threading.get_ident(), os.path.splitext(path_entry)[1]))
+        if not cv2.imwrite(path_tmp, image_result):
+            raise ValueError("ERROR: can't write image " + path_tmp)
+        os.replace(path_tmp, path_entry)
+
+        self.lru.add(path_entry)
+        return path_entry
@@ -0,0 +1,121 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 推理结果图批量导出,读图、绘制、编码分发到线程池(OpenCV释放GIL),限制同时处理的图片数,支持JPEG质量与缩略图
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, time, tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+JPEG_EXTS = (".jpg", ".jpeg")
+
+
+def render_one(path_image, detections, path_out, draw, quality=95, max_side=None):
+    """
+    @description  : 绘制一张推理结果图并写出，先绘制再缩放，检测框坐标与原图一致
+    ---------
+    @params       :
+           path_image : 噪声图或原图路径
+           detections : 该图片的推理结果，None时只缩放不绘制
+             path_out : 输出路径
+                 draw : 绘制函数 draw(detections, image) -> image
+              quality : JPEG质量
+             max_side : 长边超过该值时等比缩小
+    -------
+    """
+    image = cv2.imread(path_image)
+    if image is None:
+        raise ValueError("ERROR: can't read image " + path_image)
+    if detections is not None:
+        image = draw(detections, image)
+    if max_side and max(image.shape[:2]) > max_side:
+        scale = max_side / max(image.shape[:2])
+        image = cv2.resize(image, (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))),
+                           interpolation=cv2.INTER_AREA)
+    ext = os.path.splitext(path_out)[1]
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if ext.lower() in JPEG_EXTS else []
+    path_tmp = os.path.join(os.path.dirname(path_out), "." + os.path.basename(path_out) + ".tmp" + ext)
+    if not cv2.imwrite(path_tmp, image, params):
+        raise IOError("Failed to write " + path_out)
+    os.replace(path_tmp, path_out)
+
+
+def render_all(items, dir_out, draw, workers=None, max_inflight=None, quality=95, max_side=None):
+    """
+    @description  : 批量导出推理结果图
+    ---------
+    @params       :
+                items : (图片路径, 推理结果)的可迭代对象
+              dir_out : 输出目录，文件名与原图相同
+              workers : 线程数，默认为cpu核数
+         max_inflight : 同时处理的最大图片数，限制内存占用，默认为2倍线程数
+    -------
+    @Returns      :
+                count : 导出的图片数
+    -------
+    """
+    os.makedirs(dir_out, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_inflight = max_inflight or 2 * workers
+    count = 0
+    if workers <= 1:
+        for path_image, detections in items:
+            render_one(path_image, detections, os.path.join(dir_out, os.path.basename(path_image)), draw, quality, max_side)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = deque()
+        for path_image, detections in items:
+            if len(futures) >= max_inflight:
+                futures.popleft().result()
+                count += 1
+            futures.append(executor.submit(render_one, path_image, detections, os.path.join(dir_out, os.path.basename(path_image)),
+                                           draw, quality, max_side))
+        while futures:
+            futures.popleft().result()
+            count += 1
+    return count
+
+
+def _draw_boxes(detections, image):
+    for x1, y1, x2, y2 in detections:
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+    return image
+
+
+def benchmark(num_images=200, size=(1024, 1024), workers=None, seed=0):
+    """
+    @description  : 与逐张串行导出对比速度
+    -------
+    """
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as dir_tmp:
+        dir_in = os.path.join(dir_tmp, "in")
+        os.makedirs(dir_in)
+        items = []
+        for i in range(num_images):
+            path_image = os.path.join(dir_in, "{:05d}.jpg".format(i))
+            cv2.imwrite(path_image, rng.integers(0, 256, (size[0], size[1], 3), dtype=np.uint8))
+            boxes = np.sort(rng.integers(0, min(size), (8, 2, 2)), axis=1).reshape(8, 4)
+            items.append((path_image, boxes.tolist()))
+
+        start = time.perf_counter()
+        render_all(items, os.path.join(dir_tmp, "serial"), _draw_boxes, workers=1)
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_all(items, os.path.join(dir_tmp, "pool"), _draw_boxes, workers=workers)
+        pool_time = time.perf_counter() - start
+
+    print("{} images {}x{}: serial {:.3f}s, thread pool {:.3f}s, speedup {:.1f}x".format(
+        num_images, size[0], size[1], serial_time, pool_time, serial_time / pool_time))
+
+
+if __name__ == "__main__":
+    benchmark()
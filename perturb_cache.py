@@ -0,0 +1,128 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 扰动样本内容寻址缓存,按(原图内容哈希,噪声强度名,随机种子)存取噪声图,跨任务共享
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, shutil, hashlib
+from src.app.atomic_io import write_json
+from src.app.lru_dir import LruDir
+
+
+def _link(path_src, path_dst):
+    """
+    @description  : 原子地将path_src硬链接到path_dst，跨文件系统时退化为复制
+    -------
+    """
+    if os.path.exists(path_dst) and os.path.samefile(path_src, path_dst):
+        return
+    path_tmp = os.path.join(os.path.dirname(path_dst), ".{}.{}.tmp".format(os.path.basename(path_dst), os.getpid()))
+    if os.path.exists(path_tmp):
+        os.remove(path_tmp)
+    try:
+        os.link(path_src, path_tmp)
+    except OSError:
+        shutil.copyfile(path_src, path_tmp)
+    os.replace(path_tmp, path_dst)
+
+
+class PerturbCache():
+
+    def __init__(self, root, max_bytes=20 * 1024 ** 3, logger=None) -> None:
+        """
+        @description  : 扰动样本缓存，超过容量上限时按最近使用时间淘汰
+        ---------
+        @params       :
+                 root : 缓存根目录，多个任务共享
+            max_bytes : 缓存容量上限
+               logger : 日志
+        -------
+        """
+        self.root = root
+        self.logger = logger
+        self.track_size = True
+        # 附加信息json与噪声图同名，淘汰时一起删除。噪声图硬链接到各任务的噪声文件夹，
+        # 最近使用时间记录在json的修改时间上，不修改共享inode的修改时间(推理结果图缓存的键包含噪声图的修改时间)
+        self.lru = LruDir(os.path.join(root, "objects"), max_bytes, "扰动样本缓存", sidecar=".json", sidecar_recency=True, logger=logger)
+
+    def __getstate__(self):
+        # 子进程只写入不统计大小、不淘汰，由主进程生成结束后的trim统一处理
+        state = self.__dict__.copy()
+        state["logger"] = None
+        state["track_size"] = False
+        return state
+
+    @staticmethod
+    def digest_file(path_file):
+        h = hashlib.sha256()
+        with open(path_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _entry(self, digest, noise_name, seed, ext):
+        key = hashlib.sha256("{}:{}:{}".format(digest, noise_name, seed).encode()).hexdigest()
+        return os.path.join(self.root, "objects", key[:2], key + ext)
+
+    def fetch(self, digest, noise_name, seed, path_target):
+        """
+        @description  : 命中时将缓存的噪声图链接到path_target
+        -------
+        @Returns      :
+                 meta : 缓存条目的附加信息，未命中返回None
+        -------
+        """
+        path_entry = self._entry(digest, noise_name, seed, os.path.splitext(path_target)[1])
+        try:
+            self.lru.touch(path_entry) # 更新最近使用时间
+            meta = {}
+            path_meta = os.path.splitext(path_entry)[0] + ".json"
+            if os.path.getsize(path_meta) > 0:
+                with open(path_meta, "r") as f:
+                    meta = json.load(f)
+            _link(path_entry, path_target)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def store(self, digest, noise_name, seed, path_source, meta=None):
+        """
+        @description  : 将已写出的噪声图加入缓存，附加信息先于图片写入，图片存在即代表条目完整
+        -------
+        """
+        path_entry = self._entry(digest, noise_name, seed, os.path.splitext(path_source)[1])
+        os.makedirs(os.path.dirname(path_entry), exist_ok=True)
+        write_json(os.path.splitext(path_entry)[0] + ".json", meta or {})
+        _link(path_source, path_entry)
+
+        if self.track_size:
+            self.lru.add(path_entry)
+
+    def get_plan(self, interference):
+        """
+        @description  : 读取噪声强度对应的噪声强度名字典，命中时无需先生成一张噪声图
+        -------
+        """
+        path_plan = self._plan_path(interference)
+        if not os.path.exists(path_plan):
+            return None
+        with open(path_plan, "r") as f:
+            return json.load(f)
+
+    def put_plan(self, interference, noise_intensitydic):
+        path_plan = self._plan_path(interference)
+        os.makedirs(os.path.dirname(path_plan), exist_ok=True)
+        write_json(path_plan, noise_intensitydic)
+
+    def _plan_path(self, interference):
+        key = hashlib.sha256(json.dumps(interference, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.root, "plans", key + ".json")
+
+    def trim(self):
+        """
+        @description  : 重新统计缓存大小，超过上限时淘汰。多进程写入时子进程不统计大小，生成结束后由主进程调用
+        -------
+        """
+        self.lru.trim()
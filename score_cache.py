@@ -0,0 +1,76 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 指标分数缓存,按(推理结果内容哈希, 真值内容哈希, 抽样种子, 指标版本)存取,模型或真值变化时不会返回旧分数
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, sqlite3, hashlib, threading
+
+METRIC_VERSION = 1 # 指标计算方式变化时加一，旧缓存自动失效
+
+
+class ScoreCache():
+
+    def __init__(self, path_db) -> None:
+        """
+        @description  : sqlite单文件存储，多个任务共享；文件哈希按(路径, 大小, 修改时间)缓存，重复查看报告时只需stat
+        ---------
+        @path_db      : 数据库路径
+        -------
+        """
+        self.path_db = path_db
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path_db)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path_db, timeout=30)
+
+    def digest_file(self, path_file):
+        """
+        @description  : 文件内容sha256，文件未变化时直接返回记录的哈希
+        -------
+        """
+        stat = os.stat(path_file)
+        path_abs = os.path.abspath(path_file)
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT size, mtime, digest FROM digests WHERE path = ?", (path_abs,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        h = hashlib.sha256()
+        with open(path_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)", (path_abs, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def key(self, kind, path_results, path_gt, seed, **params):
+        """
+        @description  : 缓存键
+        ---------
+        @params       :
+                 kind : 指标名
+         path_results : 推理结果json路径列表，顺序有意义
+              path_gt : 真值json路径
+                 seed : 抽样种子
+               params : 其他影响结果的参数(抽样轮数、计算引擎等)
+        -------
+        """
+        content = [kind, METRIC_VERSION, [self.digest_file(path) for path in path_results], self.digest_file(path_gt),
+                   seed, sorted(params.items())]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM scores WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, value):
+        with self.lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO scores VALUES (?, ?)", (key, json.dumps(value)))
@@ -0,0 +1,150 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 二级指标并行计算,(噪声类别, 噪声强度, 抽样轮次)相互独立,分发到进程池后按固定顺序合并,抽样使用固定种子
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json, random, tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from src.app.fast_score import MatchTable
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+_STATE = {} # 进程池子进程中的真值与抽样子集，由initializer设置一次
+
+
+def bootstrap_keys(image_names, rounds, fraction=0.5, seed=0):
+    """
+    @description  : 生成每轮抽样的图片子集，与调度顺序无关，同一种子结果相同
+    -------
+    @Returns      :
+                 keys : rounds个图片名列表
+    -------
+    """
+    rng = random.Random(seed)
+    names = sorted(image_names)
+    return [rng.sample(names, int(fraction * len(names))) for _ in range(rounds)]
+
+
+def _init_worker(state):
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def _score_unit(path_result, rounds, state=None):
+    """
+    @description  : 计算一个噪声强度在若干抽样轮次下的mAP。numpy引擎每个结果只匹配一次，
+                    legacy引擎使用score_families预先写好的每轮真值子集文件调用RemoteSensingScore
+    -------
+    @Returns      :
+                 maps : 与rounds对应的mAP
+    -------
+    """
+    state = state if state is not None else _STATE
+    if state["engine"] == "numpy":
+        table = MatchTable(path_result, state["label"])
+        return [table.mAP(state["keys"][i]) for i in rounds]
+
+    from src.utils.baseScore import RemoteSensingScore
+    return [float(RemoteSensingScore(path_result, state["subsets"][i]).mAP()) for i in rounds]
+
+
+def _write_subsets(label, keys, dir_tmp):
+    """
+    @description  : legacy引擎每轮的真值子集只写一次临时文件，所有噪声类别与强度共用
+    -------
+    """
+    paths = []
+    try:
+        for names in keys:
+            subset = {"input_data_type": "RGB", "output_data_type": "bounding_box",
+                      "results": {name: label["results"][name] for name in names}}
+            fd, path_subset = tempfile.mkstemp(prefix="random_label_", suffix=".json", dir=dir_tmp)
+            paths.append(path_subset)
+            with os.fdopen(fd, "w") as f:
+                json.dump(subset, f)
+    except Exception:
+        _remove_subsets(paths)
+        raise
+    return paths
+
+
+def _remove_subsets(paths):
+    for path_subset in paths:
+        try:
+            os.remove(path_subset)
+        except OSError:
+            pass
+
+
+def score_families(families, path_results, label, rounds, engine="legacy", seed=0, fraction=0.5,
+                   executor="process", workers=None, dir_tmp=None):
+    """
+    @description  : 计算各噪声类别在每轮抽样下的逐强度mAP与平均mAP
+    ---------
+    @params       :
+             families : 噪声类别 -> 噪声强度名列表
+         path_results : 噪声强度名 -> 推理结果json路径
+                label : 已加载的真值
+               rounds : 抽样轮数
+               engine : numpy或legacy
+                 seed : 抽样种子
+             fraction : 每轮抽取的图片比例
+             executor : process/thread/serial
+              workers : 并行数，默认为cpu核数
+              dir_tmp : legacy引擎临时子集文件的目录
+    -------
+    @Returns      :
+      score_sec_perlevel_list : rounds个字典，噪声类别 -> 逐强度mAP列表
+               score_sec_list : rounds个字典，噪声类别 -> 平均mAP
+    -------
+    """
+    keys = bootstrap_keys(label["results"], rounds, fraction, seed)
+    if engine == "numpy":
+        state = {"engine": engine, "label": label, "keys": keys}
+    else:
+        # legacy引擎的子进程只需要子集文件路径，不传输真值
+        state = {"engine": engine, "subsets": _write_subsets(label, keys, dir_tmp)}
+    try:
+        maps = _score_units(families, path_results, rounds, engine, state, executor, workers)
+    finally:
+        _remove_subsets(state.get("subsets", []))
+
+    # 按噪声类别、强度、轮次的固定顺序合并
+    score_sec_perlevel_list = [{} for _ in range(rounds)]
+    score_sec_list = [{} for _ in range(rounds)]
+    for i in range(rounds):
+        for family, names in families.items():
+            score_noise_img_list = [maps[(family, j)][i] for j in range(len(names))]
+            score_sec_perlevel_list[i][family] = score_noise_img_list
+            score_sec_list[i][family] = sum(score_noise_img_list) / len(score_noise_img_list)
+    return score_sec_perlevel_list, score_sec_list
+
+
+def _score_units(families, path_results, rounds, engine, state, executor, workers):
+    # numpy引擎匹配占主要耗时，同一强度的所有轮次放在一个单元中；legacy引擎每轮独立
+    round_groups = [list(range(rounds))] if engine == "numpy" else [[i] for i in range(rounds)]
+    units = [(family, j, group) for family, names in families.items() for j in range(len(names)) for group in round_groups]
+
+    workers = min(workers or os.cpu_count() or 1, len(units))
+    maps = {}
+    if executor == "serial" or workers <= 1 or len(units) <= 1:
+        for family, j, group in units:
+            maps.setdefault((family, j), {}).update(zip(group, _score_unit(path_results[families[family][j]], group, state)))
+    else:
+        if executor == "process":
+            pool = EXECUTORS[executor](max_workers=workers, initializer=_init_worker, initargs=(state,))
+            submit = lambda path_result, group: pool.submit(_score_unit, path_result, group)
+        else:
+            pool = EXECUTORS[executor](max_workers=workers)
+            submit = lambda path_result, group: pool.submit(_score_unit, path_result, group, state)
+        with pool:
+            futures = [(family, j, group, submit(path_results[families[family][j]], group)) for family, j, group in units]
+            for family, j, group, future in futures:
+                maps.setdefault((family, j), {}).update(zip(group, future.result()))
+    return maps
@@ -0,0 +1,75 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : SSIM分数统计量,生成噪声时按噪声类别一次算好数量、均值、分位数与直方图并写入文件,查询时只读统计量
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, json
+import numpy as np
+from src.app.atomic_io import write_json
+
+PERCENTILES = (5, 25, 50, 75, 95)
+HIST_BINS = 20 # [0, 1]等分的区间数，小于0的分数计入第一个区间
+
+
+class SsimStore():
+
+    def __init__(self, path_dir) -> None:
+        """
+        @description  : 噪声目录下的ssim_stats.json，逐图分数仍在ssim.json中
+        ---------
+        @path_dir     : 噪声数据目录
+        -------
+        """
+        self.path_stats = os.path.join(path_dir, "ssim_stats.json")
+
+    def exists(self):
+        return os.path.exists(self.path_stats)
+
+    def write(self, ssim_score_dic):
+        """
+        @description  : 按列组织分数后计算统计量
+        ---------
+        @ssim_score_dic : 图片名 -> {噪声类别: ssim分数}
+        -------
+        """
+        families = {}
+        for scores in ssim_score_dic.values():
+            for family in scores:
+                families.setdefault(family, len(families))
+        array = np.full((len(ssim_score_dic), len(families)), np.nan, dtype=np.float64)
+        for i, scores in enumerate(ssim_score_dic.values()):
+            for family, score in scores.items():
+                array[i, families[family]] = score
+        write_json(self.path_stats, self._stats(array, list(families)))
+
+    @staticmethod
+    def _stats(array, families):
+        """
+        @description  : 每类噪声的数量、总和、均值、分位数与直方图，按列一次计算
+        -------
+        """
+        stats = {}
+        edges = np.linspace(0.0, 1.0, HIST_BINS + 1)
+        for j, family in enumerate(families):
+            column = array[:, j]
+            column = column[~np.isnan(column)]
+            if len(column) == 0:
+                continue
+            hist, _ = np.histogram(np.clip(column, 0.0, 1.0), bins=edges)
+            stats[family] = {
+                "count": int(len(column)),
+                "sum": float(column.sum()),
+                "mean": float(column.mean()),
+                "min": float(column.min()),
+                "max": float(column.max()),
+                "percentiles": {str(p): float(v) for p, v in zip(PERCENTILES, np.percentile(column, PERCENTILES))},
+                "histogram": {"edges": edges.tolist(), "counts": hist.tolist()}}
+        return stats
+
+    def stats(self):
+        with open(self.path_stats, "r") as f:
+            return json.load(f)
+
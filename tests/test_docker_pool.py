@@ -0,0 +1,118 @@
+# !/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@Description:       : 用StandInClient测试容器池的镜像去重、容器租用复用与淘汰,不依赖docker守护进程
+@Date               : 2026/10/18
+@Author             : Zhang Rujia
+@version            : 1.0
+'''
+import os, sys, time
+# 本目录位于<project_root>/src/app/tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from src.app.docker_pool import ContainerPool, PooledContainer, StandInClient
+
+
+def _create(client, tag):
+    return PooledContainer(tag, client.containers.run(tag, detach=True))
+
+
+def _write_tar(path, tag):
+    with open(path, "wb") as f:
+        f.write((tag + "\n").encode())
+    return path
+
+
+def _pool(tmp_path, **kwargs):
+    client = StandInClient()
+    closed = []
+    pool = ContainerPool(str(tmp_path / "state"), client_factory=lambda: client, on_close=closed.append, **kwargs)
+    return pool, client, closed
+
+
+def test_load_image_dedups_by_content(tmp_path):
+    pool, client, _ = _pool(tmp_path)
+    path_a = _write_tar(str(tmp_path / "a.tar"), "model:a")
+    path_b = _write_tar(str(tmp_path / "b.tar"), "model:a") # 内容相同的另一个镜像包
+    assert pool.load_image(path_a) == "model:a"
+    assert pool.load_image(path_b) == "model:a"
+    assert client.images.load_count == 1
+
+    # 索引持久化，新的容器池不重复加载
+    pool_new = ContainerPool(str(tmp_path / "state"), client_factory=lambda: client)
+    assert pool_new.load_image(path_a) == "model:a"
+    assert client.images.load_count == 1
+
+
+def test_release_and_reacquire(tmp_path):
+    pool, client, closed = _pool(tmp_path)
+    entry = pool.acquire("task_a", "model:a", _create)
+    assert pool.acquire("task_a", "model:a", _create) is entry
+
+    # 任务切换后容器保温，切换回来时不新建容器
+    pool.release("task_a")
+    assert pool.tag_of("task_a") == "model:a"
+    assert pool.acquire("task_a", "model:a", None) is entry
+    assert len(client.containers.started) == 1
+    assert closed == []
+
+
+def test_concurrent_owners_get_own_containers(tmp_path):
+    pool, client, _ = _pool(tmp_path)
+    entry_a = pool.acquire("task_a", "model:a", _create)
+    entry_b = pool.acquire("task_b", "model:a", _create)
+    assert entry_a is not entry_b
+    assert len(client.containers.started) == 2
+
+
+def test_acquire_without_create_returns_none(tmp_path):
+    pool, client, _ = _pool(tmp_path)
+    assert pool.acquire("task_a", "model:a", None) is None
+    assert client.containers.started == []
+
+
+def test_idle_eviction(tmp_path):
+    pool, client, closed = _pool(tmp_path, max_idle=1, idle_timeout=3600)
+    entries = [pool.acquire("task_" + str(i), "model:a", _create) for i in range(3)]
+    for i in range(3):
+        pool.release("task_" + str(i))
+    assert closed == entries[:2]
+    assert [c.running for c in client.containers.started] == [False, False, True]
+
+    pool.idle_timeout = 0
+    entries[2].last_used = time.time() - 1
+    pool.evict_idle()
+    assert closed == entries
+    assert pool.acquire("task_2", "model:a", None) is None
+
+
+def test_close_stops_leased_and_idle(tmp_path):
+    pool, client, closed = _pool(tmp_path)
+    pool.acquire("task_a", "model:a", _create)
+    pool.acquire("task_b", "model:b", _create)
+    pool.release("task_b")
+    pool.close()
+    assert len(closed) == 2
+    assert not any(c.running for c in client.containers.started)
+
+
+def test_discard_is_not_reused(tmp_path):
+    pool, client, closed = _pool(tmp_path)
+    entry = pool.acquire("task_a", "model:a", _create)
+    pool.discard("task_a")
+    assert closed == [entry]
+    assert not client.containers.started[0].running
+    assert pool.acquire("task_a", "model:a", None) is None
+    assert pool.acquire("task_a", "model:a", _create) is not entry
+
+
+def test_reaper_evicts_without_acquire(tmp_path):
+    pool, client, closed = _pool(tmp_path)
+    entry = pool.acquire("task_a", "model:a", _create)
+    pool.release("task_a")
+    pool.idle_timeout = 0
+    pool.start_reaper(0.01)
+    deadline = time.time() + 2
+    while closed == [] and time.time() < deadline:
+        time.sleep(0.01)
+    pool.close()
+    assert closed == [entry]